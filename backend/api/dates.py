@@ -0,0 +1,51 @@
+"""
+Date Helpers
+Shared look-back window computations for API routes
+"""
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Optional
+import asyncio
+import time
+
+# Refresh interval for the shared "now" string used in query filters
+NOW_TICK_SECONDS = 1.0
+
+_now_iso: Optional[str] = None
+
+
+@lru_cache(maxsize=128)
+def _start_date(days_back: int, bucket: int) -> str:
+    """ISO start date for a look-back window, memoized per one-second bucket"""
+    return (datetime.now() - timedelta(days=days_back)).isoformat()
+
+
+def start_date_iso(days_back: int) -> str:
+    """
+    Get ISO-formatted start date `days_back` days before now
+    
+    Calls within the same second share one string, so bursts of identical
+    requests reuse it and query filters stay stable for caching.
+    """
+    return _start_date(days_back, int(time.time()))
+
+
+def now_iso() -> str:
+    """
+    Get the current time as an ISO string for query filters
+    
+    Reads the value kept fresh by `run_now_ticker`; falls back to the clock
+    when the ticker is not running (scripts, tests).
+    """
+    return _now_iso or datetime.now().isoformat()
+
+
+async def run_now_ticker(interval: float = NOW_TICK_SECONDS):
+    """Refresh the shared "now" string every `interval` seconds until cancelled"""
+    global _now_iso
+    try:
+        while True:
+            _now_iso = datetime.now().isoformat()
+            await asyncio.sleep(interval)
+    finally:
+        _now_iso = None
@@ -0,0 +1,75 @@
+"""
+Response Caching
+In-process TTL cache with HTTP cache headers for read-mostly endpoints
+"""
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from functools import wraps
+from typing import Callable, Dict, Tuple
+import hashlib
+import inspect
+import orjson
+import time
+
+
+def ttl_cache(ttl: int = 300, maxsize: int = 256):
+    """
+    Cache a route's JSON response in-process for `ttl` seconds
+    
+    Entries are keyed by the route's query parameters. Responses carry
+    Cache-Control and ETag headers so browsers/CDNs can cache as well, and
+    a matching If-None-Match is answered with 304 without a body.
+    
+    Args:
+        ttl: Seconds a cached response stays fresh
+        maxsize: Maximum number of distinct parameter sets kept
+    """
+    def decorator(func: Callable):
+        cache: Dict[Tuple, Tuple[float, bytes, str]] = {}
+        signature = inspect.signature(func)
+        has_request = 'request' in signature.parameters
+        
+        @wraps(func)
+        async def wrapper(**kwargs):
+            request: Request = kwargs['request'] if has_request else kwargs.pop('request')
+            key = tuple(sorted((k, v) for k, v in kwargs.items() if k != 'request'))
+            
+            now = time.monotonic()
+            entry = cache.get(key)
+            if entry is None or entry[0] <= now:
+                result = await func(**kwargs)
+                if isinstance(result, Response):
+                    body = result.body
+                else:
+                    body = orjson.dumps(jsonable_encoder(result))
+                etag = f'"{hashlib.sha1(body).hexdigest()}"'
+                
+                cache.pop(key, None)
+                if len(cache) >= maxsize:
+                    # Evict the oldest entry (dicts keep insertion order)
+                    cache.pop(next(iter(cache)))
+                entry = (now + ttl, body, etag)
+                cache[key] = entry
+            
+            _, body, etag = entry
+            headers = {
+                'Cache-Control': f'public, max-age={ttl}',
+                'ETag': etag
+            }
+            
+            if request.headers.get('if-none-match') == etag:
+                return Response(status_code=304, headers=headers)
+            
+            return Response(content=body, media_type='application/json', headers=headers)
+        
+        if not has_request:
+            # Expose a `request` parameter so FastAPI injects it for ETag checks
+            parameters = list(signature.parameters.values())
+            parameters.append(inspect.Parameter(
+                'request', inspect.Parameter.KEYWORD_ONLY, annotation=Request
+            ))
+            wrapper.__signature__ = signature.replace(parameters=parameters)
+        
+        return wrapper
+    
+    return decorator
@@ -2,14 +2,18 @@
 Analytics API Routes
 Advanced analytics endpoints for patterns, regimes, and performance
 """
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse
 from typing import List, Optional
-from datetime import datetime, timedelta
-from pydantic import BaseModel
-import pandas as pd
+from datetime import datetime
+from pydantic import BaseModel, Field
+from collections import Counter
+import asyncio
 import numpy as np
 
-from config.supabase_config import get_supabase_client
+from config.supabase_config import USE_SQL_RPC
+from api.middleware.cache import ttl_cache
+from api.dates import start_date_iso
 
 router = APIRouter()
 
@@ -44,67 +48,93 @@ class PerformanceMetricsResponse(BaseModel):
     sharpe_ratio: Optional[float]
 
 
-@router.get("/analytics/patterns", response_model=List[PatternResponse])
+class RegimeBatchRequest(BaseModel):
+    """Symbols for a batch regime lookup"""
+    symbols: List[str] = Field(..., min_length=1, max_length=50)
+
+
+def _column_mean(rows: List[dict], column: str) -> float:
+    """Mean of a column over raw response rows, ignoring nulls"""
+    values = np.fromiter(
+        (np.nan if row[column] is None else row[column] for row in rows),
+        dtype=np.float64,
+        count=len(rows)
+    )
+    return float(np.nanmean(values))
+
+
+@router.get("/analytics/patterns", responses={200: {"model": List[PatternResponse]}})
 async def get_discovered_patterns(
+    request: Request,
     symbol: str = Query("HDFCBANK.NS"),
     days_back: int = Query(30, ge=1, le=365),
     pattern_type: Optional[str] = None
 ):
     """Get discovered chart patterns and regimes"""
     try:
-        client = get_supabase_client(service_role=False)
+        client = request.app.state.supabase
         
-        start_date = (datetime.now() - timedelta(days=days_back)).isoformat()
+        start_date = start_date_iso(days_back)
         
+        # Select exactly the PatternResponse fields so rows can be returned as-is
         query = client.table('pattern_discovery') \
-            .select('*') \
+            .select('id, symbol, detected_at, pattern_type, pattern_start, pattern_end, confidence, signal, strength, description') \
             .eq('symbol', symbol) \
             .gte('detected_at', start_date)
         
         if pattern_type:
             query = query.eq('pattern_type', pattern_type)
         
-        response = query.order('detected_at', desc=True).execute()
-        
-        patterns = [PatternResponse(**p) for p in response.data]
+        response = await query.order('detected_at', desc=True).execute()
         
-        return patterns
+        return ORJSONResponse(content=response.data)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/analytics/regime")
-async def get_current_regime(symbol: str = Query("HDFCBANK.NS")):
+async def get_current_regime(request: Request, symbol: str = Query("HDFCBANK.NS")):
     """Get current market regime classification"""
     try:
-        client = get_supabase_client(service_role=False)
-        
-        # Get latest features with regime info
-        response = client.table('features_store') \
-            .select('timestamp, regime_classification, trend_strength, volatility_20d') \
-            .eq('symbol', symbol) \
-            .order('timestamp', desc=True) \
-            .limit(1) \
-            .execute()
-        
-        if not response.data:
+        client = request.app.state.supabase
+        
+        start_date = start_date_iso(30)
+        
+        if USE_SQL_RPC:
+            # Latest regime row and 30-day distribution in a single round trip
+            bundle_response = await client.rpc('get_regime_bundle', {
+                'p_symbol': symbol,
+                'p_start': start_date
+            }).execute()
+            bundle = bundle_response.data or {}
+            latest = bundle.get('latest')
+            regime_distribution = bundle.get('distribution') or {}
+        else:
+            # Get latest features with regime info and regime history (last 30 days)
+            response, history_response = await asyncio.gather(
+                client.table('features_store')
+                    .select('timestamp, regime_classification, trend_strength, volatility_20d')
+                    .eq('symbol', symbol)
+                    .order('timestamp', desc=True)
+                    .limit(1)
+                    .execute(),
+                client.table('features_store')
+                    .select('timestamp, regime_classification')
+                    .eq('symbol', symbol)
+                    .gte('timestamp', start_date)
+                    .order('timestamp', desc=False)
+                    .execute()
+            )
+            latest = response.data[0] if response.data else None
+            regime_distribution = dict(Counter(
+                row['regime_classification'] for row in history_response.data
+                if row['regime_classification'] is not None
+            ))
+        
+        if not latest:
             raise HTTPException(status_code=404, detail="No regime data available")
         
-        latest = response.data[0]
-        
-        # Get regime history (last 30 days)
-        start_date = (datetime.now() - timedelta(days=30)).isoformat()
-        history_response = client.table('features_store') \
-            .select('timestamp, regime_classification') \
-            .eq('symbol', symbol) \
-            .gte('timestamp', start_date) \
-            .order('timestamp', desc=False) \
-            .execute()
-        
-        regime_history = pd.DataFrame(history_response.data)
-        regime_distribution = regime_history['regime_classification'].value_counts().to_dict()
-        
         return {
             "symbol": symbol,
             "current_regime": latest['regime_classification'],
@@ -120,44 +150,77 @@ async def get_current_regime(symbol: str = Query("HDFCBANK.NS")):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/analytics/performance", response_model=List[PerformanceMetricsResponse])
+@router.post("/analytics/regime/batch")
+async def get_current_regimes_batch(request: Request, batch: RegimeBatchRequest):
+    """Get current market regime for several symbols in one query"""
+    try:
+        client = request.app.state.supabase
+        
+        response = await client.table('latest_regime') \
+            .select('symbol, timestamp, regime_classification, trend_strength, volatility_20d') \
+            .in_('symbol', batch.symbols) \
+            .execute()
+        
+        regimes = {
+            row['symbol']: {
+                "current_regime": row['regime_classification'],
+                "trend_strength": row['trend_strength'],
+                "volatility": row['volatility_20d'],
+                "as_of": row['timestamp']
+            }
+            for row in response.data
+        }
+        
+        return {
+            "regimes": regimes,
+            "missing": [symbol for symbol in batch.symbols if symbol not in regimes]
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/analytics/performance", responses={200: {"model": List[PerformanceMetricsResponse]}})
+@ttl_cache(ttl=300)
 async def get_model_performance(
+    request: Request,
     model_name: Optional[str] = None,
     days_back: int = Query(30, ge=7, le=365)
 ):
     """Get model performance metrics over time"""
     try:
-        client = get_supabase_client(service_role=False)
+        client = request.app.state.supabase
         
-        start_date = (datetime.now() - timedelta(days=days_back)).isoformat()
+        start_date = start_date_iso(days_back)
         
+        # Select exactly the PerformanceMetricsResponse fields so rows can be returned as-is
         query = client.table('performance_metrics') \
-            .select('*') \
+            .select('model_name, model_version, period_start, period_end, rmse, mae, mape, directional_accuracy, paper_pnl, sharpe_ratio') \
             .gte('calculated_at', start_date)
         
         if model_name:
             query = query.eq('model_name', model_name)
         
-        response = query.order('calculated_at', desc=True).execute()
+        response = await query.order('calculated_at', desc=True).execute()
         
-        metrics = [PerformanceMetricsResponse(**m) for m in response.data]
-        
-        return metrics
+        return ORJSONResponse(content=response.data)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/analytics/feature-importance")
+@ttl_cache(ttl=3600)
 async def get_feature_importance(
+    request: Request,
     model_name: str = Query("advanced_xgboost"),
     model_version: str = Query("v1.0")
 ):
     """Get feature importance from model metadata"""
     try:
-        client = get_supabase_client(service_role=False)
+        client = request.app.state.supabase
         
-        response = client.table('model_metadata') \
+        response = await client.table('model_metadata') \
             .select('feature_importance, trained_at') \
             .eq('model_name', model_name) \
             .eq('model_version', model_version) \
@@ -181,17 +244,19 @@ async def get_feature_importance(
 
 
 @router.get("/analytics/sector-correlation")
+@ttl_cache(ttl=300)
 async def get_sector_correlation(
+    request: Request,
     symbol: str = Query("HDFCBANK.NS"),
     days_back: int = Query(90, ge=30, le=365)
 ):
     """Get correlation with sector indices and banking peers"""
     try:
-        client = get_supabase_client(service_role=False)
+        client = request.app.state.supabase
         
-        start_date = (datetime.now() - timedelta(days=days_back)).isoformat()
+        start_date = start_date_iso(days_back)
         
-        response = client.table('features_store') \
+        response = await client.table('features_store') \
             .select('timestamp, correlation_nifty_bank, correlation_banking_peers, relative_strength_sector') \
             .eq('symbol', symbol) \
             .gte('timestamp', start_date) \
@@ -201,15 +266,13 @@ async def get_sector_correlation(
         if not response.data:
             raise HTTPException(status_code=404, detail="No correlation data available")
         
-        df = pd.DataFrame(response.data)
-        
         # Calculate average correlations
-        avg_nifty_corr = df['correlation_nifty_bank'].mean()
-        avg_peers_corr = df['correlation_banking_peers'].mean()
-        avg_rel_strength = df['relative_strength_sector'].mean()
+        avg_nifty_corr = _column_mean(response.data, 'correlation_nifty_bank')
+        avg_peers_corr = _column_mean(response.data, 'correlation_banking_peers')
+        avg_rel_strength = _column_mean(response.data, 'relative_strength_sector')
         
         # Get latest values
-        latest = df.iloc[-1]
+        latest = response.data[-1]
         
         return {
             "symbol": symbol,
@@ -235,37 +298,38 @@ async def get_sector_correlation(
 
 @router.get("/analytics/technical-indicators")
 async def get_technical_indicators(
+    request: Request,
     symbol: str = Query("HDFCBANK.NS"),
     days_back: int = Query(30, ge=1, le=365)
 ):
     """Get technical indicators breakdown"""
     try:
-        client = get_supabase_client(service_role=False)
-        
-        start_date = (datetime.now() - timedelta(days=days_back)).isoformat()
-        
-        response = client.table('features_store') \
-            .select('timestamp, sma_5, sma_20, sma_50, rsi_14, macd, macd_signal, bollinger_upper, bollinger_middle, bollinger_lower') \
-            .eq('symbol', symbol) \
-            .gte('timestamp', start_date) \
-            .order('timestamp', desc=False) \
-            .execute()
-        
-        if not response.data:
+        client = request.app.state.supabase
+        
+        start_date = start_date_iso(days_back)
+        
+        if USE_SQL_RPC:
+            bundle_response = await client.rpc('get_technical_indicators_bundle', {
+                'p_symbol': symbol,
+                'p_start': start_date
+            }).execute()
+            time_series = (bundle_response.data or {}).get('time_series') or []
+        else:
+            # Close price comes joined onto each indicator row - no separate price query
+            response = await client.table('features_with_price') \
+                .select('timestamp, close, sma_5, sma_20, sma_50, rsi_14, macd, macd_signal, bollinger_upper, bollinger_middle, bollinger_lower') \
+                .eq('symbol', symbol) \
+                .gte('timestamp', start_date) \
+                .order('timestamp', desc=False) \
+                .execute()
+            time_series = response.data
+        
+        if not time_series:
             raise HTTPException(status_code=404, detail="No indicator data available")
         
-        # Get current price for context
-        price_response = client.table('market_data_raw') \
-            .select('close') \
-            .eq('symbol', symbol) \
-            .order('timestamp', desc=True) \
-            .limit(1) \
-            .execute()
-        
-        current_price = float(price_response.data[0]['close']) if price_response.data else None
-        
         # Get latest indicators
-        latest = response.data[-1]
+        latest = time_series[-1]
+        current_price = float(latest['close']) if latest.get('close') is not None else None
         
         # Determine signals
         signals = {}
@@ -293,7 +357,7 @@ async def get_technical_indicators(
             "current_price": current_price,
             "latest_indicators": latest,
             "signals": signals,
-            "time_series": response.data
+            "time_series": time_series
         }
         
     except HTTPException:
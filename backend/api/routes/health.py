@@ -2,14 +2,21 @@
 Health Check Routes
 System health and status endpoints
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from datetime import datetime
+from functools import lru_cache
+import asyncio
 import os
+from supabase import AsyncClient
 
-from config.supabase_config import get_supabase_client
+from config.supabase_config import USE_SQL_RPC
+from api.middleware.cache import ttl_cache
 
 router = APIRouter()
 
+MODELS_PATH = "models/saved_models"
+
 
 @router.get("/health")
 async def health_check():
@@ -22,7 +29,7 @@ async def health_check():
 
 
 @router.get("/health/detailed")
-async def detailed_health_check():
+async def detailed_health_check(request: Request):
     """Detailed health check with database connectivity"""
     health_status = {
         "status": "healthy",
@@ -30,49 +37,93 @@ async def detailed_health_check():
         "components": {}
     }
     
-    # Check database connectivity
+    # Database ping and models directory scan are independent - run concurrently
+    database_status, models_status = await asyncio.gather(
+        _check_database(request.app.state.supabase),
+        run_in_threadpool(_check_models_directory)
+    )
+    
+    if database_status["status"] != "healthy":
+        health_status["status"] = "degraded"
+    
+    health_status["components"]["database"] = database_status
+    health_status["components"]["models"] = models_status
+    
+    return health_status
+
+
+async def _check_database(client: AsyncClient) -> dict:
+    """Check database connectivity"""
     try:
-        client = get_supabase_client(service_role=False)
-        response = client.table('system_logs').select('id').limit(1).execute()
-        health_status["components"]["database"] = {
+        await client.table('system_logs').select('id').limit(1).execute()
+        return {
             "status": "healthy",
             "message": "Database connection successful"
         }
     except Exception as e:
-        health_status["status"] = "degraded"
-        health_status["components"]["database"] = {
+        return {
             "status": "unhealthy",
             "message": str(e)
         }
-    
-    # Check if models directory exists
-    models_path = "models/saved_models"
-    if os.path.exists(models_path):
-        model_files = os.listdir(models_path)
-        health_status["components"]["models"] = {
-            "status": "healthy",
-            "models_count": len([f for f in model_files if f.endswith('.pkl')])
-        }
-    else:
-        health_status["components"]["models"] = {
+
+
+@lru_cache(maxsize=1)
+def _count_model_files(models_mtime_ns: int) -> int:
+    """Count saved model artifacts (cached until the directory changes)"""
+    with os.scandir(MODELS_PATH) as entries:
+        return sum(1 for entry in entries if entry.name.endswith(('.pkl', '.ubj', '.npz')))
+
+
+def _check_models_directory() -> dict:
+    """Check if models directory exists (blocking filesystem access)"""
+    try:
+        models_mtime_ns = os.stat(MODELS_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return {
             "status": "warning",
             "message": "Models directory not found"
         }
     
-    return health_status
+    return {
+        "status": "healthy",
+        "models_count": _count_model_files(models_mtime_ns)
+    }
 
 
 @router.get("/health/models")
-async def models_health():
+@ttl_cache(ttl=300)
+async def models_health(
+    request: Request,
+    include_models: bool = Query(True, description="Include the model list (counts only if false)")
+):
     """Check status of trained models"""
     try:
-        client = get_supabase_client(service_role=False)
+        client = request.app.state.supabase
         
-        response = client.table('model_metadata') \
+        if not include_models:
+            # Count-only requests: no rows are transferred, just the count header
+            total_response, production_response = await asyncio.gather(
+                client.table('model_metadata')
+                    .select('id', count='exact', head=True)
+                    .eq('status', 'active')
+                    .execute(),
+                client.table('model_metadata')
+                    .select('id', count='exact', head=True)
+                    .eq('status', 'active')
+                    .eq('is_production', True)
+                    .execute()
+            )
+            return {
+                "total_models": total_response.count or 0,
+                "production_models": production_response.count or 0
+            }
+        
+        response = await client.table('model_metadata') \
             .select('model_name, model_version, status, is_production, trained_at') \
             .eq('status', 'active') \
             .execute()
         
+        # The list is needed anyway, so count from it rather than issuing extra queries
         return {
             "total_models": len(response.data),
             "production_models": len([m for m in response.data if m['is_production']]),
@@ -84,33 +135,38 @@ async def models_health():
 
 
 @router.get("/health/data-freshness")
-async def data_freshness():
+async def data_freshness(request: Request):
     """Check data freshness"""
     try:
-        client = get_supabase_client(service_role=False)
+        client = request.app.state.supabase
         
-        # Check latest market data
-        market_response = client.table('market_data_raw') \
-            .select('timestamp') \
-            .eq('symbol', 'HDFCBANK.NS') \
-            .order('timestamp', desc=True) \
-            .limit(1) \
-            .execute()
+        if USE_SQL_RPC:
+            # All three "latest" lookups in one round trip
+            freshness_response = await client.rpc('get_data_freshness', {
+                'p_symbol': 'HDFCBANK.NS'
+            }).execute()
+            return freshness_response.data
         
-        # Check latest features
-        features_response = client.table('features_store') \
-            .select('timestamp') \
-            .eq('symbol', 'HDFCBANK.NS') \
-            .order('timestamp', desc=True) \
-            .limit(1) \
-            .execute()
-        
-        # Check latest predictions
-        predictions_response = client.table('predictions') \
-            .select('created_at') \
-            .order('created_at', desc=True) \
-            .limit(1) \
-            .execute()
+        # Latest market data, features and predictions are independent queries
+        market_response, features_response, predictions_response = await asyncio.gather(
+            client.table('market_data_raw')
+                .select('timestamp')
+                .eq('symbol', 'HDFCBANK.NS')
+                .order('timestamp', desc=True)
+                .limit(1)
+                .execute(),
+            client.table('features_store')
+                .select('timestamp')
+                .eq('symbol', 'HDFCBANK.NS')
+                .order('timestamp', desc=True)
+                .limit(1)
+                .execute(),
+            client.table('predictions')
+                .select('created_at')
+                .order('created_at', desc=True)
+                .limit(1)
+                .execute()
+        )
         
         return {
             "market_data_latest": market_response.data[0] if market_response.data else None,
@@ -2,15 +2,21 @@
 Market Data API Routes
 Endpoints for retrieving market data
 """
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from typing import List, Optional
-from datetime import datetime, timedelta
-from pydantic import BaseModel
+from datetime import datetime
+from pydantic import BaseModel, Field, TypeAdapter
+import orjson
 
-from config.supabase_config import get_supabase_client
+from api.middleware.cache import ttl_cache
+from api.dates import start_date_iso
 
 router = APIRouter()
 
+# Pages larger than this are returned as plain JSON without per-row model validation
+TYPED_RESPONSE_MAX_ROWS = 200
+
 
 class MarketDataPoint(BaseModel):
     """Market data point model"""
@@ -32,29 +38,60 @@ class MarketDataResponse(BaseModel):
     data: List[MarketDataPoint]
 
 
+class LatestPriceBatchRequest(BaseModel):
+    """Symbols for a batch latest-price lookup"""
+    symbols: List[str] = Field(..., min_length=1, max_length=50)
+
+
+# Bulk validator for OHLCV rows - one pydantic-core call per page
+MARKET_DATA_ADAPTER = TypeAdapter(List[MarketDataPoint])
+
+
 @router.get("/market-data/ohlcv", response_model=MarketDataResponse)
 async def get_ohlcv_data(
+    request: Request,
     symbol: str = Query("HDFCBANK.NS"),
     days_back: int = Query(30, ge=1, le=3650),
-    interval: str = Query("1d", description="Data interval (only 1d supported currently)")
+    interval: str = Query("1d", description="Data interval (only 1d supported currently)"),
+    limit: int = Query(1000, ge=1, le=1000, description="Maximum rows per page"),
+    offset: int = Query(0, ge=0, description="Rows to skip (for pagination)"),
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$", description="'ndjson' streams one row per line")
 ):
     """Get OHLCV market data"""
     try:
-        client = get_supabase_client(service_role=False)
+        client = request.app.state.supabase
         
-        start_date = (datetime.now() - timedelta(days=days_back)).isoformat()
+        start_date = start_date_iso(days_back)
         
-        response = client.table('market_data_raw') \
+        response = await client.table('market_data_raw') \
             .select('timestamp, open, high, low, close, volume, adjusted_close') \
             .eq('symbol', symbol) \
             .gte('timestamp', start_date) \
             .order('timestamp', desc=False) \
+            .range(offset, offset + limit - 1) \
             .execute()
         
         if not response.data:
             raise HTTPException(status_code=404, detail=f"No data found for {symbol}")
         
-        data_points = [MarketDataPoint(**dp) for dp in response.data]
+        if response_format == "ndjson":
+            # Stream rows line by line instead of serializing one large document
+            return StreamingResponse(
+                (orjson.dumps(row) + b"\n" for row in response.data),
+                media_type="application/x-ndjson"
+            )
+        
+        if limit > TYPED_RESPONSE_MAX_ROWS:
+            # Large pages: return rows as-is, skipping MarketDataPoint construction
+            return ORJSONResponse(content={
+                "symbol": symbol,
+                "data_points": len(response.data),
+                "start_date": response.data[0]['timestamp'],
+                "end_date": response.data[-1]['timestamp'],
+                "data": response.data
+            })
+        
+        data_points = MARKET_DATA_ADAPTER.validate_python(response.data)
         
         return MarketDataResponse(
             symbol=symbol,
@@ -71,16 +108,14 @@ async def get_ohlcv_data(
 
 
 @router.get("/market-data/latest")
-async def get_latest_price(symbol: str = Query("HDFCBANK.NS")):
+async def get_latest_price(request: Request, symbol: str = Query("HDFCBANK.NS")):
     """Get latest price for a symbol"""
     try:
-        client = get_supabase_client(service_role=False)
+        client = request.app.state.supabase
         
-        response = client.table('market_data_raw') \
-            .select('*') \
+        response = await client.table('latest_market_data') \
+            .select('timestamp, open, high, low, close, volume, adjusted_close') \
             .eq('symbol', symbol) \
-            .order('timestamp', desc=True) \
-            .limit(1) \
             .execute()
         
         if not response.data:
@@ -97,13 +132,36 @@ async def get_latest_price(symbol: str = Query("HDFCBANK.NS")):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/market-data/latest/batch")
+async def get_latest_prices_batch(request: Request, batch: LatestPriceBatchRequest):
+    """Get latest prices for several symbols in one query"""
+    try:
+        client = request.app.state.supabase
+        
+        response = await client.table('latest_market_data') \
+            .select('symbol, timestamp, open, high, low, close, volume, adjusted_close') \
+            .in_('symbol', batch.symbols) \
+            .execute()
+        
+        latest_data = {row.pop('symbol'): row for row in response.data}
+        
+        return {
+            "latest_data": latest_data,
+            "missing": [symbol for symbol in batch.symbols if symbol not in latest_data]
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/market-data/symbols")
-async def get_available_symbols():
+@ttl_cache(ttl=3600)
+async def get_available_symbols(request: Request):
     """Get list of available symbols"""
     try:
-        client = get_supabase_client(service_role=False)
+        client = request.app.state.supabase
         
-        response = client.table('reference_symbols') \
+        response = await client.table('reference_symbols') \
             .select('symbol, name, category') \
             .eq('is_active', True) \
             .execute()
@@ -2,16 +2,31 @@
 Predictions API Routes
 Endpoints for getting and managing predictions
 """
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse
 from typing import List, Optional
 from datetime import datetime, timedelta
-from pydantic import BaseModel
-import pandas as pd
+from pydantic import BaseModel, TypeAdapter
+import asyncio
+import numpy as np
 
-from config.supabase_config import get_supabase_client
+from config.supabase_config import USE_SQL_RPC
+from api.dates import now_iso, start_date_iso
 
 router = APIRouter()
 
+# Column lists per endpoint - only fields the responses actually use
+PREDICTION_COLUMNS = (
+    'id, symbol, prediction_timestamp, target_timestamp, predicted_price, '
+    'confidence_lower, confidence_upper, model_name, model_version, '
+    'predicted_direction, direction_probability, actual_price, prediction_error'
+)
+HISTORICAL_PREDICTION_COLUMNS = PREDICTION_COLUMNS + ', direction_correct'
+COMPARISON_COLUMNS = (
+    'id, model_name, model_version, target_timestamp, predicted_price, '
+    'confidence_lower, confidence_upper, predicted_direction, direction_probability'
+)
+
 
 class PredictionResponse(BaseModel):
     """Prediction response model"""
@@ -40,8 +55,13 @@ class LatestPredictionsResponse(BaseModel):
     generated_at: datetime
 
 
+# Validates a whole list in one core call instead of one __init__ per row
+PREDICTIONS_ADAPTER = TypeAdapter(List[PredictionResponse])
+
+
 @router.get("/predictions/latest", response_model=LatestPredictionsResponse)
 async def get_latest_predictions(
+    request: Request,
     symbol: str = Query("HDFCBANK.NS", description="Stock symbol"),
     model_name: str = Query("advanced_xgboost", description="Model name")
 ):
@@ -50,32 +70,30 @@ async def get_latest_predictions(
     Returns predictions for next 1-5 days
     """
     try:
-        client = get_supabase_client(service_role=False)  # Read-only
+        client = request.app.state.supabase  # Read-only
         
-        # Get current price
-        current_price_response = client.table('market_data_raw') \
-            .select('close') \
-            .eq('symbol', symbol) \
-            .order('timestamp', desc=True) \
-            .limit(1) \
-            .execute()
+        # Current price and latest predictions are independent - fetch concurrently
+        current_price_response, predictions_response = await asyncio.gather(
+            client.table('latest_market_data')
+                .select('close')
+                .eq('symbol', symbol)
+                .execute(),
+            client.table('predictions')
+                .select(PREDICTION_COLUMNS)
+                .eq('symbol', symbol)
+                .eq('model_name', model_name)
+                .gte('target_timestamp', now_iso())
+                .order('target_timestamp', desc=False)
+                .limit(5)
+                .execute()
+        )
         
         if not current_price_response.data:
             raise HTTPException(status_code=404, detail=f"No data found for {symbol}")
         
         current_price = float(current_price_response.data[0]['close'])
         
-        # Get latest predictions
-        predictions_response = client.table('predictions') \
-            .select('*') \
-            .eq('symbol', symbol) \
-            .eq('model_name', model_name) \
-            .gte('target_timestamp', datetime.now().isoformat()) \
-            .order('target_timestamp', desc=False) \
-            .limit(5) \
-            .execute()
-        
-        predictions = [PredictionResponse(**pred) for pred in predictions_response.data]
+        predictions = PREDICTIONS_ADAPTER.validate_python(predictions_response.data)
         
         return LatestPredictionsResponse(
             symbol=symbol,
@@ -92,21 +110,24 @@ async def get_latest_predictions(
 
 @router.get("/predictions/historical")
 async def get_historical_predictions(
+    request: Request,
     symbol: str = Query("HDFCBANK.NS"),
     days_back: int = Query(30, ge=1, le=365),
-    model_name: Optional[str] = None
+    model_name: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=1000, description="Maximum rows per page"),
+    offset: int = Query(0, ge=0, description="Rows to skip (for pagination)")
 ):
     """
     Get historical predictions with actual outcomes
     Useful for performance visualization
     """
     try:
-        client = get_supabase_client(service_role=False)
+        client = request.app.state.supabase
         
-        start_date = (datetime.now() - timedelta(days=days_back)).isoformat()
+        start_date = start_date_iso(days_back)
         
         query = client.table('predictions') \
-            .select('*') \
+            .select(HISTORICAL_PREDICTION_COLUMNS) \
             .eq('symbol', symbol) \
             .gte('target_timestamp', start_date) \
             .not_.is_('actual_price', 'null')  # Only predictions with actual outcomes
@@ -114,14 +135,17 @@ async def get_historical_predictions(
         if model_name:
             query = query.eq('model_name', model_name)
         
-        response = query.order('target_timestamp', desc=False).execute()
+        response = await query.order('target_timestamp', desc=False) \
+            .range(offset, offset + limit - 1) \
+            .execute()
         
-        return {
+        # Rows are already JSON-serializable - skip FastAPI's jsonable_encoder pass
+        return ORJSONResponse(content={
             "symbol": symbol,
             "period_days": days_back,
             "predictions_count": len(response.data),
             "predictions": response.data
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -129,6 +153,7 @@ async def get_historical_predictions(
 
 @router.get("/predictions/comparison")
 async def compare_models(
+    request: Request,
     symbol: str = Query("HDFCBANK.NS"),
     days_ahead: int = Query(1, ge=1, le=5)
 ):
@@ -136,25 +161,33 @@ async def compare_models(
     Compare predictions from different models for same target date
     """
     try:
-        client = get_supabase_client(service_role=False)
+        client = request.app.state.supabase
         
         target_date = (datetime.now() + timedelta(days=days_ahead)).date().isoformat()
         
-        response = client.table('predictions') \
-            .select('*') \
-            .eq('symbol', symbol) \
-            .gte('target_timestamp', target_date) \
-            .lt('target_timestamp', f"{target_date}T23:59:59") \
-            .order('model_name', desc=False) \
-            .execute()
-        
-        # Group by model
-        models_predictions = {}
-        for pred in response.data:
-            model = pred['model_name']
-            if model not in models_predictions:
-                models_predictions[model] = []
-            models_predictions[model].append(pred)
+        if USE_SQL_RPC:
+            # Postgres groups rows per model and returns the final mapping
+            response = await client.rpc('compare_models_grouped', {
+                'p_symbol': symbol,
+                'p_target_date': target_date
+            }).execute()
+            models_predictions = response.data or {}
+        else:
+            response = await client.table('predictions') \
+                .select(COMPARISON_COLUMNS) \
+                .eq('symbol', symbol) \
+                .gte('target_timestamp', target_date) \
+                .lt('target_timestamp', f"{target_date}T23:59:59") \
+                .order('model_name', desc=False) \
+                .execute()
+            
+            # Group by model
+            models_predictions = {}
+            for pred in response.data:
+                model = pred['model_name']
+                if model not in models_predictions:
+                    models_predictions[model] = []
+                models_predictions[model].append(pred)
         
         return {
             "symbol": symbol,
@@ -168,6 +201,7 @@ async def compare_models(
 
 @router.get("/predictions/accuracy")
 async def get_prediction_accuracy(
+    request: Request,
     symbol: str = Query("HDFCBANK.NS"),
     model_name: str = Query("advanced_xgboost"),
     days_back: int = Query(30, ge=7, le=365)
@@ -176,19 +210,43 @@ async def get_prediction_accuracy(
     Calculate prediction accuracy metrics for a model
     """
     try:
-        client = get_supabase_client(service_role=False)
+        client = request.app.state.supabase
         
-        start_date = (datetime.now() - timedelta(days=days_back)).isoformat()
+        start_date = start_date_iso(days_back)
         
-        response = client.table('predictions') \
-            .select('predicted_price, actual_price, prediction_error, direction_correct') \
-            .eq('symbol', symbol) \
-            .eq('model_name', model_name) \
-            .gte('target_timestamp', start_date) \
-            .not_.is_('actual_price', 'null') \
-            .execute()
+        if USE_SQL_RPC:
+            # Aggregate in Postgres - only the metric scalars are transferred
+            stats_response = await client.rpc('prediction_accuracy_stats', {
+                'p_symbol': symbol,
+                'p_model_name': model_name,
+                'p_start': start_date
+            }).execute()
+            stats = stats_response.data[0] if stats_response.data else {'sample_size': 0}
+        else:
+            response = await client.table('predictions') \
+                .select('predicted_price, actual_price, prediction_error, direction_correct') \
+                .eq('symbol', symbol) \
+                .eq('model_name', model_name) \
+                .gte('target_timestamp', start_date) \
+                .not_.is_('actual_price', 'null') \
+                .execute()
+            
+            rows = response.data
+            stats = {'sample_size': len(rows)}
+            if rows:
+                # None -> NaN so nan-aware reductions skip missing errors
+                errors = np.array([r['prediction_error'] for r in rows], dtype=np.float64)
+                actuals = np.array([r['actual_price'] for r in rows], dtype=np.float64)
+                abs_errors = np.abs(errors)
+                directions = [r['direction_correct'] for r in rows if r['direction_correct'] is not None]
+                
+                # Calculate metrics
+                stats['rmse'] = np.sqrt(np.nanmean(errors * errors))
+                stats['mae'] = np.nanmean(abs_errors)
+                stats['mape'] = np.nanmean(abs_errors / actuals) * 100
+                stats['directional_accuracy'] = sum(directions) / len(directions) if directions else None
         
-        if not response.data:
+        if not stats['sample_size']:
             # Return empty metrics instead of 404
             return {
                 "symbol": symbol,
@@ -204,24 +262,14 @@ async def get_prediction_accuracy(
                 "message": "No predictions with actual outcomes found yet. Predictions are available for future dates."
             }
         
-        df = pd.DataFrame(response.data)
-        
-        # Calculate metrics
-        rmse = (df['prediction_error'] ** 2).mean() ** 0.5
-        mae = df['prediction_error'].abs().mean()
-        mape = (df['prediction_error'].abs() / df['actual_price']).mean() * 100
-        directional_accuracy = df['direction_correct'].mean() if 'direction_correct' in df.columns else None
-        
         return {
             "symbol": symbol,
             "model_name": model_name,
             "period_days": days_back,
-            "sample_size": len(df),
+            "sample_size": int(stats['sample_size']),
             "metrics": {
-                "rmse": float(rmse),
-                "mae": float(mae),
-                "mape": float(mape),
-                "directional_accuracy": float(directional_accuracy) if directional_accuracy is not None else None
+                key: float(stats[key]) if stats.get(key) is not None else None
+                for key in ('rmse', 'mae', 'mape', 'directional_accuracy')
             }
         }
         
@@ -0,0 +1,69 @@
+"""
+Local Parquet Cache
+Shared on-disk cache for fetched market data and engineered features
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+import pandas as pd
+from loguru import logger
+
+# Each fetch re-reads the trailing CACHE_REFETCH_DAYS so recently rewritten rows
+# are picked up, and a cache older than CACHE_MAX_AGE_HOURS is rebuilt from
+# scratch so rewritten history (re-engineered features, split-adjusted
+# re-bootstraps) is too. CACHE_MAX_AGE_HOURS=0 disables the cache.
+CACHE_DIR = "data/cache"
+CACHE_REFETCH_DAYS = int(os.getenv("CACHE_REFETCH_DAYS", 60))
+CACHE_MAX_AGE_HOURS = float(os.getenv("CACHE_MAX_AGE_HOURS", 24))
+
+# Requested windows start on an arbitrary calendar day, but the first stored
+# bar on or after it can be several days later (weekends, market holidays), so
+# a cache starting within this tolerance still covers the window
+WINDOW_START_TOLERANCE = timedelta(days=7)
+
+
+def cache_enabled() -> bool:
+    """Whether the Parquet cache is in use (CACHE_MAX_AGE_HOURS > 0)"""
+    return CACHE_MAX_AGE_HOURS > 0
+
+
+def cache_path(name: str) -> str:
+    """Parquet cache file for `name`"""
+    return os.path.join(CACHE_DIR, f"{name}.parquet")
+
+
+def read_cache(path: str) -> Optional[pd.DataFrame]:
+    """Read a Parquet cache (None if missing, expired or unreadable)"""
+    if not os.path.exists(path):
+        return None
+    try:
+        df = pd.read_parquet(path)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable cache {path}: {str(e)}")
+        return None
+
+    # Age counts from the last full fetch (tail refreshes keep 'built_at');
+    # DataFrame.attrs round-trip through Parquet since pandas 2.1
+    if datetime.now().timestamp() - df.attrs.get('built_at', 0) > CACHE_MAX_AGE_HOURS * 3600:
+        return None
+    return df
+
+
+def write_cache(df: pd.DataFrame, path: str, built_at: float):
+    """Write a Parquet cache built by a full fetch at `built_at`; failures only cost the next run a full fetch"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df.attrs['built_at'] = built_at
+        df.to_parquet(path, compression='zstd', index=False)
+    except Exception as e:
+        logger.warning(f"Could not write cache {path}: {str(e)}")
+
+
+def covers_window(df: pd.DataFrame, window_start: pd.Timestamp) -> bool:
+    """Whether a cached frame reaches back to the start of the requested window"""
+    return not df.empty and df['timestamp'].min() <= window_start + WINDOW_START_TOLERANCE
+
+
+def refetch_start(df: pd.DataFrame) -> pd.Timestamp:
+    """First timestamp to re-download for a cached frame (trailing overlap)"""
+    return df['timestamp'].max() - timedelta(days=CACHE_REFETCH_DAYS)
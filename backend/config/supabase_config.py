@@ -2,13 +2,61 @@
 Supabase Configuration and Client Setup
 Provides singleton client instances for both service role and anon access
 """
+import asyncio
 import os
-from typing import Optional
-from supabase import create_client, Client
+from typing import Dict, Optional, Union
+import httpx
+from supabase import create_client, acreate_client, Client, AsyncClient
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Use Postgres functions (see supabase/schema.sql) for server-side aggregation.
+# Set USE_SQL_RPC=false to fall back to client-side computation.
+USE_SQL_RPC = os.getenv("USE_SQL_RPC", "true").lower() == "true"
+
+# Direct Postgres connection string (Supabase "Connection string" setting) for
+# bulk loads via COPY. Leave unset to keep all writes on the REST API.
+SUPABASE_DB_URL = os.getenv("SUPABASE_DB_URL")
+
+# Connection pool for each client's PostgREST session. Ingestion fans symbols
+# out over threads, so keep enough idle connections around for all of them.
+POOL_LIMITS = httpx.Limits(
+    max_keepalive_connections=int(os.getenv("SUPABASE_POOL_KEEPALIVE", 32)),
+    max_connections=int(os.getenv("SUPABASE_POOL_SIZE", 64))
+)
+
+
+def _swap_postgrest_session(client: Union[Client, AsyncClient]) -> Union[httpx.Client, httpx.AsyncClient]:
+    """Rebuild the client's PostgREST HTTP/2 session with POOL_LIMITS, returning the old session"""
+    # Relies on supabase==2.9.0 / postgrest==0.17.1 internals (pinned in
+    # requirements.txt): `client.postgrest` is built once and cached, and its
+    # httpx session is a plain attribute.
+    # supabase-py drops the cached PostgREST client on SIGNED_IN, TOKEN_REFRESHED
+    # and SIGNED_OUT auth events, which would lose these limits; the key-only
+    # service/anon clients here never sign in, so that doesn't happen.
+    postgrest = client.postgrest
+    session = postgrest.session
+    postgrest.session = type(session)(
+        base_url=session.base_url,
+        headers=session.headers,
+        timeout=session.timeout,
+        follow_redirects=True,
+        http2=True,
+        limits=POOL_LIMITS
+    )
+    return session
+
+def _use_pool_limits(client: Client) -> Client:
+    """Give a sync client a PostgREST session with POOL_LIMITS (closing the default one)"""
+    _swap_postgrest_session(client).close()
+    return client
+
+async def _ause_pool_limits(client: AsyncClient) -> AsyncClient:
+    """Give an async client a PostgREST session with POOL_LIMITS (closing the default one)"""
+    await _swap_postgrest_session(client).aclose()
+    return client
+
 class SupabaseConfig:
     """Centralized Supabase configuration"""
     
@@ -19,16 +67,36 @@ class SupabaseConfig:
         
         if not all([self.url, self.anon_key, self.service_key]):
             raise ValueError("Missing Supabase credentials in environment variables")
+        
+        # Build each client once so the underlying httpx connection pool
+        # (and its keep-alive connections) is reused across calls
+        self._service_client = _use_pool_limits(create_client(self.url, self.service_key))
+        self._anon_client = _use_pool_limits(create_client(self.url, self.anon_key))
+        
+        # Async clients need an event loop, so they are created lazily (under
+        # a lock, so concurrent first callers don't each build a client)
+        self._async_clients: Dict[bool, AsyncClient] = {}
+        self._async_clients_lock = asyncio.Lock()
     
     @property
     def service_client(self) -> Client:
         """Get Supabase client with service role (write access)"""
-        return create_client(self.url, self.service_key)
+        return self._service_client
     
     @property
     def anon_client(self) -> Client:
         """Get Supabase client with anon key (read-only, for testing)"""
-        return create_client(self.url, self.anon_key)
+        return self._anon_client
+    
+    async def get_async_client(self, service_role: bool = True) -> AsyncClient:
+        """Get cached async Supabase client (non-blocking, for API routes)"""
+        if service_role not in self._async_clients:
+            async with self._async_clients_lock:
+                # Another caller may have created it while we waited for the lock
+                if service_role not in self._async_clients:
+                    key = self.service_key if service_role else self.anon_key
+                    self._async_clients[service_role] = await _ause_pool_limits(await acreate_client(self.url, key))
+        return self._async_clients[service_role]
 
 
 # Singleton instances
@@ -45,9 +113,27 @@ def get_supabase_client(service_role: bool = True) -> Client:
     """
     Get Supabase client
     
+    Returns the process-wide client for the role, so every model/service
+    instance shares one HTTP/2 keep-alive connection pool.
+    
     Args:
         service_role: If True, returns service role client (write access)
                      If False, returns anon client (read-only)
     """
     config = get_supabase_config()
     return config.service_client if service_role else config.anon_client
+
+
+async def get_async_supabase_client(service_role: bool = True) -> AsyncClient:
+    """
+    Get async Supabase client
+    
+    Use from async route handlers so `await ...execute()` yields to the
+    event loop during network I/O instead of blocking it.
+    
+    Args:
+        service_role: If True, returns service role client (write access)
+                     If False, returns anon client (read-only)
+    """
+    config = get_supabase_config()
+    return await config.get_async_client(service_role)
@@ -0,0 +1,19 @@
+"""
+Gunicorn Configuration
+Production server: gunicorn main:app -c gunicorn.conf.py
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('BACKEND_PORT', 8000)}"
+
+# One uvicorn (uvloop + httptools) worker per core
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Import the app once in the master, then fork workers (shared copy-on-write pages)
+preload_app = True
+
+# No access log and warning-level error log in production
+accesslog = None
+loglevel = os.getenv("LOG_LEVEL", "warning")
@@ -4,26 +4,63 @@ Production-grade API for HDFC stock prediction platform
 """
 from fastapi import FastAPI, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from contextlib import asynccontextmanager, suppress
 from datetime import datetime, timedelta
 from typing import List, Optional
+import anyio
+import asyncio
 import os
+import sys
 from dotenv import load_dotenv
 
 from api.routes import predictions, analytics, health, market_data
 from api.middleware.security import verify_api_key
+from api.dates import run_now_ticker
+from config.supabase_config import get_supabase_config, get_async_supabase_client
 
 load_dotenv()
 
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", 64))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Validate configuration and build shared clients before serving requests"""
+    # Fails fast on missing credentials instead of 500'ing on the first request
+    get_supabase_config()
+    
+    # Read-only client shared by all route handlers (request.app.state.supabase)
+    app.state.supabase = await get_async_supabase_client(service_role=False)
+    
+    # Threadpool for sync endpoints / run_in_threadpool (anyio defaults to 40)
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    
+    # Shared clock string for query filters (see api.dates.now_iso)
+    now_ticker = asyncio.create_task(run_now_ticker())
+    
+    yield
+    
+    now_ticker.cancel()
+    with suppress(asyncio.CancelledError):
+        await now_ticker
+
+
 # Create FastAPI app
 app = FastAPI(
     title="HDFC Stock Prediction API",
     description="Production-grade stock prediction platform with real-time updates",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
+# Compress larger JSON payloads (OHLCV/prediction lists compress well)
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # CORS middleware
 allowed_origins = os.getenv("ALLOWED_ORIGINS", "http://localhost:5173").split(",")
 
@@ -54,19 +91,21 @@ async def root():
 # Error handlers
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={"error": exc.detail, "status_code": exc.status_code}
     )
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={"error": "Internal server error", "detail": str(exc)}
     )
 
 if __name__ == "__main__":
+    # Development server with auto-reload.
+    # Production: gunicorn main:app -c gunicorn.conf.py
     import uvicorn
     
     port = int(os.getenv("BACKEND_PORT", 8000))
@@ -74,6 +113,9 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=port,
+        # uvloop is not available on Windows
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
         reload=True,
         log_level="info"
     )
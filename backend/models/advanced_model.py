@@ -2,17 +2,69 @@
 Advanced Time Series Model - XGBoost with Sector Awareness
 Production-grade model with feature engineering
 """
+import io
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Dict, Tuple, Optional, List
 from loguru import logger
 import joblib
+import os
 import xgboost as xgb
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
-from sklearn.preprocessing import StandardScaler
 
-from config.supabase_config import get_supabase_client
+from config.supabase_config import USE_SQL_RPC, get_supabase_client
+from config.cache import cache_enabled, cache_path, covers_window, read_cache, refetch_start, write_cache
+
+# XGBoost device: 'cpu' or 'cuda' (GPU histogram building)
+XGB_DEVICE = os.getenv("XGB_DEVICE", "cpu")
+
+# Upper bound on concurrent PostgREST page requests when paging without the RPC
+MAX_PAGE_FETCHES = 32
+
+
+# Model inputs, in training order. Built once; prepare_features adds the
+# derived lag/rolling/regime columns to the frame.
+BASE_FEATURE_COLUMNS = (
+    # Technical indicators
+    'sma_5', 'sma_20', 'sma_50', 'ema_12', 'ema_26',
+    'rsi_14', 'macd', 'macd_signal', 'macd_histogram',
+    'bollinger_upper', 'bollinger_middle', 'bollinger_lower',
+    'atr_14',
+    # Price features
+    'returns_1d', 'returns_5d', 'returns_20d', 'volatility_20d',
+    # Volume features
+    'volume_ratio',
+    # Sector features
+    'correlation_nifty_bank', 'correlation_banking_peers', 'relative_strength_sector',
+    # Regime features
+    'trend_strength'
+)
+LAG_SOURCE_COLUMNS = ('returns_1d', 'rsi_14', 'macd', 'volatility_20d')
+LAG_FEATURE_COLUMNS = tuple(f'{col}_lag{lag}' for col in LAG_SOURCE_COLUMNS for lag in (1, 2))
+ROLLING_FEATURE_COLUMNS = ('returns_1d_rolling_mean_5', 'returns_1d_rolling_std_5')
+REGIMES = ('high_volatility', 'ranging', 'trending_down', 'trending_up')
+REGIME_FEATURE_COLUMNS = tuple(f'regime_{regime}' for regime in REGIMES)
+FEATURE_COLUMNS = BASE_FEATURE_COLUMNS + LAG_FEATURE_COLUMNS + ROLLING_FEATURE_COLUMNS + REGIME_FEATURE_COLUMNS
+
+# Columns returned as text by PostgREST; everything else is numeric
+TEXT_COLUMNS = {'id', 'symbol', 'timestamp', 'feature_version', 'regime_classification', 'created_at'}
+
+
+def _rows_to_frame(rows: List[Dict]) -> pd.DataFrame:
+    """Build a DataFrame column by column from PostgREST rows (numeric columns as float32)"""
+    if not rows:
+        return pd.DataFrame()
+    
+    columns = {}
+    for col in rows[0]:
+        values = [row[col] for row in rows]
+        columns[col] = values if col in TEXT_COLUMNS else np.array(values, dtype=np.float32)
+    
+    return pd.DataFrame(columns, copy=False)
 
 
 class AdvancedXGBoostModel:
@@ -25,200 +77,340 @@ class AdvancedXGBoostModel:
     def __init__(self):
         self.client = get_supabase_client(service_role=True)
         self.model = None
-        self.scaler = StandardScaler()
-        self.feature_columns = []
+        self.scaler = None  # {"mean": ..., "scale": ...} per feature, float32
+        self.feature_columns = FEATURE_COLUMNS
+        
+    def fetch_training_data(self, symbol: str, days_back: int = 730, use_cache: bool = True) -> pd.DataFrame:
+        """
+        Fetch engineered features for training
+        
+        Fetched history is kept in a local Parquet cache per (symbol, feature
+        version); when it covers the window, only the trailing
+        CACHE_REFETCH_DAYS are downloaded (see config.cache).
+        """
+        try:
+            start_date = (datetime.now() - timedelta(days=days_back)).isoformat()
+            window_start = pd.Timestamp(start_date, tz='UTC')
+            feature_cache_path = self._feature_cache_path(symbol)
+            use_cache = use_cache and cache_enabled()
+            
+            cached = read_cache(feature_cache_path) if use_cache else None
+            if cached is not None and not covers_window(cached, window_start):
+                # Cache starts after the requested window - rebuild it
+                cached = None
+            
+            built_at = cached.attrs['built_at'] if cached is not None else datetime.now().timestamp()
+            
+            if cached is not None:
+                # Re-fetch a trailing overlap so rewritten recent rows replace cached ones
+                overlap_start = refetch_start(cached)
+                rows = self._fetch_feature_rows(symbol, overlap_start.isoformat())
+                cached = cached[cached['timestamp'] < overlap_start]
+                df = pd.concat([cached, self._to_feature_frame(rows)], ignore_index=True) \
+                    .drop_duplicates('timestamp', keep='last')
+                logger.info(f"Loaded {len(cached)} cached feature records, fetched {len(rows)} new")
+            else:
+                rows = self._fetch_feature_rows(symbol, start_date)
+                
+                if not rows:
+                    logger.warning(f"No feature data found for date range {start_date}, trying all available data")
+                    # Try fetching all available data if date filter returns nothing
+                    rows = self._fetch_feature_rows(symbol)
+                    
+                    if not rows:
+                        logger.error("No feature data available at all")
+                        return pd.DataFrame()
+                
+                df = self._to_feature_frame(rows)
+            
+            df = df.sort_values('timestamp', ignore_index=True)
+            
+            if use_cache:
+                write_cache(df, feature_cache_path, built_at)
+            
+            # Limit to the training window unless it has no data
+            in_window = df[df['timestamp'] >= window_start]
+            if not in_window.empty:
+                df = in_window.reset_index(drop=True)
+            
+            logger.info(f"Fetched {len(df)} feature records")
+            return df
+            
+        except Exception as e:
+            logger.error(f"Error fetching training data: {str(e)}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return pd.DataFrame()
+    
+    def _feature_cache_path(self, symbol: str) -> str:
+        """Parquet cache file for a symbol's features (RPC rows also carry close)"""
+        suffix = '_with_close' if USE_SQL_RPC else ''
+        return cache_path(f"{symbol}_{self.FEATURE_VERSION}{suffix}")
+    
+    @staticmethod
+    def _to_feature_frame(rows: List[Dict]) -> pd.DataFrame:
+        """Build a feature frame with parsed UTC timestamps"""
+        df = _rows_to_frame(rows)
+        if not df.empty:
+            df['timestamp'] = pd.to_datetime(df['timestamp'], format='ISO8601', utc=True, cache=True)
+        return df
+    
+    def fetch_recent_features(self, symbol: str, days_back: int = 100) -> pd.DataFrame:
+        """
+        Fetch the feature rows of the last `days_back` days for prediction
         
-    def fetch_training_data(self, symbol: str, days_back: int = 730) -> pd.DataFrame:
-        """Fetch engineered features for training"""
+        Reads features_store directly (no close join, no cache) as CSV, parsed
+        column-wise with numeric columns as float32; returns an empty frame
+        when the window has no rows.
+        """
         try:
             start_date = (datetime.now() - timedelta(days=days_back)).isoformat()
             
+            # PostgREST renders the rows as CSV (Accept: text/csv), which pandas'
+            # C reader parses column by column instead of row dict by row dict
             response = self.client.table('features_store') \
                 .select('*') \
                 .eq('symbol', symbol) \
                 .eq('feature_version', self.FEATURE_VERSION) \
                 .gte('timestamp', start_date) \
                 .order('timestamp', desc=False) \
+                .csv() \
                 .execute()
             
-            if not response.data:
-                logger.warning(f"No feature data found for date range {start_date}, trying all available data")
-                # Try fetching all available data if date filter returns nothing
-                response = self.client.table('features_store') \
-                    .select('*') \
-                    .eq('symbol', symbol) \
-                    .eq('feature_version', self.FEATURE_VERSION) \
-                    .order('timestamp', desc=False) \
-                    .execute()
-                
-                if not response.data:
-                    logger.error("No feature data available at all")
-                    return pd.DataFrame()
+            if not response.data or not response.data.strip():
+                return pd.DataFrame()
             
-            df = pd.DataFrame(response.data)
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df = df.sort_values('timestamp')
+            df = pd.read_csv(
+                io.StringIO(response.data),
+                dtype={col: str for col in TEXT_COLUMNS}
+            )
+            if df.empty:
+                return pd.DataFrame()
+            
+            numeric = [col for col in df.columns if col not in TEXT_COLUMNS]
+            df[numeric] = df[numeric].astype(np.float32)
+            df['timestamp'] = pd.to_datetime(df['timestamp'], format='ISO8601', utc=True, cache=True)
             
-            logger.info(f"Fetched {len(df)} feature records")
             return df
             
         except Exception as e:
-            logger.error(f"Error fetching training data: {str(e)}")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.error(f"Error fetching recent features: {str(e)}")
             return pd.DataFrame()
     
+    def _fetch_feature_rows(self, symbol: str, start_date: Optional[str] = None) -> List[Dict]:
+        """
+        Fetch feature rows, optionally from `start_date` onwards
+        
+        With USE_SQL_RPC the rows come from get_features_with_close,
+        already joined with the same-day close, so create_sequences skips its price fetch.
+        """
+        if USE_SQL_RPC:
+            response = self.client.rpc('get_features_with_close', {
+                'p_symbol': symbol,
+                'p_feature_version': self.FEATURE_VERSION,
+                'p_start': start_date
+            }).execute()
+            return response.data or []
+        
+        query = self.client.table('features_store') \
+            .select('*') \
+            .eq('symbol', symbol) \
+            .eq('feature_version', self.FEATURE_VERSION)
+        if start_date:
+            query = query.gte('timestamp', start_date)
+        
+        return query.order('timestamp', desc=False).execute().data
+    
     def prepare_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Prepare feature matrix"""
-        # Define feature columns
-        self.feature_columns = [
-            # Technical indicators
-            'sma_5', 'sma_20', 'sma_50', 'ema_12', 'ema_26',
-            'rsi_14', 'macd', 'macd_signal', 'macd_histogram',
-            'bollinger_upper', 'bollinger_middle', 'bollinger_lower',
-            'atr_14',
-            # Price features
-            'returns_1d', 'returns_5d', 'returns_20d', 'volatility_20d',
-            # Volume features
-            'volume_ratio',
-            # Sector features
-            'correlation_nifty_bank', 'correlation_banking_peers', 'relative_strength_sector',
-            # Regime features
-            'trend_strength'
-        ]
-        
-        # Lag features (previous day's values)
-        lag_features = ['returns_1d', 'rsi_14', 'macd', 'volatility_20d']
-        for col in lag_features:
-            if col in df.columns:
-                df[f'{col}_lag1'] = df[col].shift(1)
-                df[f'{col}_lag2'] = df[col].shift(2)
-                self.feature_columns.extend([f'{col}_lag1', f'{col}_lag2'])
-        
-        # Rolling features
+        """Add lag, rolling and regime features (columns listed in FEATURE_COLUMNS)"""
+        # Lag features (previous day's values) - all lags built in one array
+        lag_features = [col for col in LAG_SOURCE_COLUMNS if col in df.columns]
+        if lag_features:
+            base = df[lag_features].to_numpy(dtype=np.float32, na_value=np.nan)
+            lagged = np.full((len(df), len(lag_features), 2), np.nan, dtype=np.float32)
+            lagged[1:, :, 0] = base[:-1]
+            lagged[2:, :, 1] = base[:-2]
+            
+            lag_columns = [f'{col}_lag{lag}' for col in lag_features for lag in (1, 2)]
+            df[lag_columns] = lagged.reshape(len(df), -1)
+        
+        # Rolling features (5-day window; NaN until the window is full, like rolling()),
+        # accumulated in float64 and stored as float32 like every other model input
         if 'returns_1d' in df.columns:
-            df['returns_1d_rolling_mean_5'] = df['returns_1d'].rolling(window=5).mean()
-            df['returns_1d_rolling_std_5'] = df['returns_1d'].rolling(window=5).std()
-            self.feature_columns.extend(['returns_1d_rolling_mean_5', 'returns_1d_rolling_std_5'])
+            returns = df['returns_1d'].to_numpy(dtype=np.float64, na_value=np.nan)
+            rolling = np.full((len(df), 2), np.nan, dtype=np.float32)
+            if len(returns) >= 5:
+                windows = sliding_window_view(returns, 5)
+                rolling[4:, 0] = windows.mean(axis=1)
+                rolling[4:, 1] = windows.std(axis=1, ddof=1)
+            
+            df[list(ROLLING_FEATURE_COLUMNS)] = rolling
         
         # Regime encoding - ensure all 4 categories always exist
         if 'regime_classification' in df.columns:
-            # Define all possible regime categories
-            all_regimes = ['high_volatility', 'ranging', 'trending_down', 'trending_up']
-            
-            # Initialize all regime columns to 0
-            for regime in all_regimes:
-                df[f'regime_{regime}'] = 0
-            
-            # Set the appropriate regime to 1 based on actual classification
-            for regime in all_regimes:
-                mask = df['regime_classification'] == regime
-                df.loc[mask, f'regime_{regime}'] = 1
-            
-            # Add to feature columns if not already added (training phase)
-            regime_cols = [f'regime_{r}' for r in all_regimes]
-            if not any(col in self.feature_columns for col in regime_cols):
-                self.feature_columns.extend(regime_cols)
+            # One-hot encode in one pass; fixed categories keep every column (unknowns -> all 0)
+            regimes = df['regime_classification'].astype(pd.CategoricalDtype(REGIMES))
+            dummies = pd.get_dummies(regimes, prefix='regime', dtype=np.uint8)
+            df = pd.concat([df.drop(columns=dummies.columns, errors='ignore'), dummies], axis=1)
         
         return df
     
-    def create_sequences(self, df: pd.DataFrame, target_col: str = 'close', 
-                        forecast_horizon: int = 1) -> Tuple[pd.DataFrame, pd.Series]:
+    def fetch_close_prices(self, symbol: str) -> List[Dict]:
         """
-        Create feature matrix and target for supervised learning
+        Fetch the full ordered close price series for a symbol
         
-        Args:
-            df: DataFrame with features
-            target_col: Column to predict (from market_data_raw)
-            forecast_horizon: Days ahead to predict
+        Uses the get_close_series RPC (one round trip); without it, pages
+        are requested concurrently as prepared GETs after a count-only query.
         """
+        if USE_SQL_RPC:
+            response = self.client.rpc('get_close_series', {'p_symbol': symbol}).execute()
+            return response.data or []
+        
+        page_size = 1000
+        count_response = self.client.table('market_data_raw') \
+            .select('timestamp', count='exact', head=True) \
+            .eq('symbol', symbol) \
+            .execute()
+        total = count_response.count or 0
+        
+        # Prepared PostgREST request on the client's own session (auth headers,
+        # keep-alive, gzip); only the Range header changes per page
+        session = self.client.postgrest.session
+        params = {
+            'select': 'timestamp,close',
+            'symbol': f'eq.{symbol}',
+            'order': 'timestamp.asc'
+        }
+        
+        def fetch_page(range_start: int) -> List[Dict]:
+            response = session.get(
+                '/market_data_raw',
+                params=params,
+                headers={'Range-Unit': 'items', 'Range': f'{range_start}-{range_start + page_size - 1}'}
+            )
+            response.raise_for_status()
+            return response.json()
+        
+        page_starts = range(0, total, page_size)
+        if not page_starts:
+            return []
+        
+        # Dispatch every page at once and wait once (capped to keep the pool sane)
+        with ThreadPoolExecutor(max_workers=min(len(page_starts), MAX_PAGE_FETCHES)) as executor:
+            pages = executor.map(fetch_page, page_starts)
+            return [row for page in pages for row in page]
+    
+    def _merge_close_prices(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Join features with same-day close prices fetched from market_data_raw"""
         # Fetch actual close prices for target (all records, not limited to 1000)
-        all_prices = []
-        range_start = 0
-        range_size = 1000
-        
-        while True:
-            response = self.client.table('market_data_raw') \
-                .select('timestamp, close') \
-                .eq('symbol', 'HDFCBANK.NS') \
-                .order('timestamp', desc=False) \
-                .range(range_start, range_start + range_size - 1) \
-                .execute()
-            
-            if not response.data:
-                break
-                
-            all_prices.extend(response.data)
-            
-            if len(response.data) < range_size:
-                break
-                
-            range_start += range_size
+        all_prices = self.fetch_close_prices('HDFCBANK.NS')
         
         logger.info(f"Fetched {len(all_prices)} price records total")
         
-        price_df = pd.DataFrame(all_prices)
-        price_df['timestamp'] = pd.to_datetime(price_df['timestamp'])
+        price_df = _rows_to_frame(all_prices)
+        price_df['timestamp'] = pd.to_datetime(price_df['timestamp'], format='ISO8601', utc=True, cache=True)
         
         # Debug: Check timestamp formats
         logger.info(f"Feature timestamps sample: {df['timestamp'].iloc[:3].tolist()}")
         logger.info(f"Price timestamps sample: {price_df['timestamp'].iloc[:3].tolist()}")
         
-        # Ensure both timestamps are datetime
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        
-        # Normalize timestamps to date only (YYYY-MM-DD)
-        df['date_str'] = df['timestamp'].dt.strftime('%Y-%m-%d')
-        price_df['date_str'] = price_df['timestamp'].dt.strftime('%Y-%m-%d')
+        # Normalize timestamps to int64 day keys (days since epoch) for a fast integer join
+        df['date_key'] = df['timestamp'].values.astype('datetime64[D]').view('int64')
+        price_df['date_key'] = price_df['timestamp'].values.astype('datetime64[D]').view('int64')
         
-        logger.info(f"Feature dates sample: {df['date_str'].iloc[:3].tolist()}")
-        logger.info(f"Price dates sample: {price_df['date_str'].iloc[:3].tolist()}")
-        logger.info(f"Common dates: {len(set(df['date_str']) & set(price_df['date_str']))}")
+        logger.info(f"Common dates: {len(np.intersect1d(df['date_key'].values, price_df['date_key'].values))}")
         
-        # Merge on string date for exact matching
-        merged = df.merge(price_df[['date_str', 'close']], on='date_str', how='inner')
+        # Merge on day key for exact date matching
+        merged = df.merge(price_df[['date_key', 'close']], on='date_key', how='inner')
         
         logger.info(f"After merge: {len(merged)} records (from {len(df)} features and {len(price_df)} prices)")
         
         if len(merged) == 0:
             logger.error("Merge failed - no matching dates!")
-            logger.error(f"Feature date range: {df['date_str'].min()} to {df['date_str'].max()}")
-            logger.error(f"Price date range: {price_df['date_str'].min()} to {price_df['date_str'].max()}")
+            logger.error(f"Feature date range: {df['timestamp'].min().date()} to {df['timestamp'].max().date()}")
+            logger.error(f"Price date range: {price_df['timestamp'].min().date()} to {price_df['timestamp'].max().date()}")
             raise ValueError("No matching dates between features and prices")
         
+        return merged.sort_values('date_key')
+    
+    def create_sequences(self, df: pd.DataFrame, target_col: str = 'close', 
+                        forecast_horizon: int = 1) -> Tuple[np.ndarray, np.ndarray, pd.Series]:
+        """
+        Create feature matrix and target for supervised learning
+        
+        Args:
+            df: DataFrame with features
+            target_col: Column to predict (from market_data_raw)
+            forecast_horizon: Days ahead to predict
+        """
+        if 'close' in df.columns:
+            # Features were fetched already joined with close prices
+            merged = df.sort_values('timestamp')
+        else:
+            merged = self._merge_close_prices(df)
+        
         # Create target (next day's close price)
-        merged = merged.sort_values('date_str')
         merged['target'] = merged['close'].shift(-forecast_horizon)
         
-        # Drop rows with NaN in features or target
-        merged = merged.dropna(subset=self.feature_columns + ['target'])
+        # Keep rows with no NaN in features or target - one mask, one indexing pass
+        features = merged[list(self.feature_columns)].to_numpy(dtype=np.float32, na_value=np.nan)
+        target = merged['target'].to_numpy(dtype=np.float32, na_value=np.nan)
+        mask = ~(np.isnan(features).any(axis=1) | np.isnan(target))
         
-        X = merged[self.feature_columns]
-        y = merged['target']
-        timestamps = merged['timestamp']
+        X = features[mask]
+        y = target[mask]
+        timestamps = merged['timestamp'][mask]
         
         logger.info(f"Created {len(X)} samples with {len(self.feature_columns)} features")
         
         return X, y, timestamps
     
-    def prepare_data(self, X: pd.DataFrame, y: pd.Series, 
+    def fit_scaler(self, X: np.ndarray):
+        """Fit per-feature mean/std for standardization (zero std -> 1, like StandardScaler)"""
+        mean = X.mean(axis=0, dtype=np.float64).astype(np.float32)
+        scale = X.std(axis=0, dtype=np.float64).astype(np.float32)
+        scale[scale == 0] = 1
+        self.scaler = {'mean': mean, 'scale': scale}
+    
+    def scale_features(self, X, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Standardize a feature matrix with the fitted mean/std (into float32 `out` if given)"""
+        X = np.asarray(X)
+        if out is None:
+            out = np.empty(X.shape, dtype=np.float32)
+        np.subtract(X, self.scaler['mean'], out=out)
+        np.divide(out, self.scaler['scale'], out=out)
+        return out
+    
+    def prepare_data(self, X: np.ndarray, y: np.ndarray, 
                     train_ratio: float = 0.8) -> Tuple:
         """Split and scale data"""
         train_size = int(len(X) * train_ratio)
         
-        X_train, X_val = X.iloc[:train_size], X.iloc[train_size:]
-        y_train, y_val = y.iloc[:train_size], y.iloc[train_size:]
+        X_train, X_val = X[:train_size], X[train_size:]
+        y_train, y_val = y[:train_size], y[train_size:]
         
-        # Scale features
-        X_train_scaled = self.scaler.fit_transform(X_train)
-        X_val_scaled = self.scaler.transform(X_val)
+        # Scale features (float32 in, float32 out)
+        self.fit_scaler(X_train)
+        X_train_scaled = self.scale_features(X_train)
+        X_val_scaled = self.scale_features(X_val)
         
         logger.info(f"Training samples: {len(X_train)}, Validation samples: {len(X_val)}")
         
         return X_train_scaled, X_val_scaled, y_train, y_val
     
-    def train(self, X_train: np.ndarray, y_train: pd.Series, 
-             X_val: np.ndarray, y_val: pd.Series) -> Dict:
+    def _to_dmatrix(self, X, y=None) -> xgb.DMatrix:
+        """Wrap a feature matrix (and optional target) for the native XGBoost API"""
+        return xgb.DMatrix(X, label=y, feature_names=list(self.feature_columns))
+    
+    def _predict_dmatrix(self, dmatrix: xgb.DMatrix) -> np.ndarray:
+        """Predict using the trees up to the early-stopping best iteration"""
+        best_iteration = getattr(self.model, 'best_iteration', None)
+        if best_iteration is None:
+            return self.model.predict(dmatrix)
+        return self.model.predict(dmatrix, iteration_range=(0, best_iteration + 1))
+    
+    def train(self, X_train: np.ndarray, y_train: np.ndarray, 
+             X_val: np.ndarray, y_val: np.ndarray) -> Dict:
         """
         Train XGBoost model
         
@@ -231,36 +423,41 @@ class AdvancedXGBoostModel:
         try:
             logger.info("Training XGBoost model...")
             
-            # XGBoost parameters
+            # XGBoost parameters (native API - histogram trees, device from XGB_DEVICE)
             params = {
                 'objective': 'reg:squarederror',
+                'tree_method': 'hist',
+                'device': XGB_DEVICE,
                 'max_depth': 6,
                 'learning_rate': 0.05,
-                'n_estimators': 200,
                 'subsample': 0.8,
                 'colsample_bytree': 0.8,
                 'min_child_weight': 3,
                 'gamma': 0.1,
                 'reg_alpha': 0.1,
                 'reg_lambda': 1.0,
-                'random_state': 42,
-                'n_jobs': -1
+                'seed': 42
             }
+            num_boost_round = 200
             
-            self.model = xgb.XGBRegressor(**params)
+            # Build each DMatrix once and reuse it for training and metrics
+            dtrain = self._to_dmatrix(X_train, y_train)
+            dval = self._to_dmatrix(X_val, y_val)
             
             # Train with early stopping
-            self.model.fit(
-                X_train, y_train,
-                eval_set=[(X_val, y_val)],
+            self.model = xgb.train(
+                params,
+                dtrain,
+                num_boost_round=num_boost_round,
+                evals=[(dval, 'val')],
                 early_stopping_rounds=20,
-                verbose=False
+                verbose_eval=False
             )
             
             logger.info("Model training completed")
             
             # Training metrics
-            train_pred = self.model.predict(X_train)
+            train_pred = self._predict_dmatrix(dtrain)
             train_rmse = np.sqrt(mean_squared_error(y_train, train_pred))
             train_mae = mean_absolute_error(y_train, train_pred)
             train_r2 = r2_score(y_train, train_pred)
@@ -269,7 +466,7 @@ class AdvancedXGBoostModel:
                 'train_rmse': train_rmse,
                 'train_mae': train_mae,
                 'train_r2': train_r2,
-                'hyperparameters': params
+                'hyperparameters': {**params, 'n_estimators': num_boost_round}
             }
             
             logger.info(f"Training RMSE: {train_rmse:.4f}, MAE: {train_mae:.4f}, R2: {train_r2:.4f}")
@@ -280,24 +477,26 @@ class AdvancedXGBoostModel:
             logger.error(f"Error training model: {str(e)}")
             raise
     
-    def validate(self, X_val: np.ndarray, y_val: pd.Series) -> Dict:
+    def validate(self, X_val: np.ndarray, y_val: np.ndarray) -> Dict:
         """Validate model"""
         try:
-            val_pred = self.model.predict(X_val)
+            val_pred = self._predict_dmatrix(self._to_dmatrix(X_val))
             
             val_rmse = np.sqrt(mean_squared_error(y_val, val_pred))
             val_mae = mean_absolute_error(y_val, val_pred)
             val_r2 = r2_score(y_val, val_pred)
             
-            # Directional accuracy
-            y_val_array = y_val.values
-            actual_direction = np.sign(y_val_array[1:] - y_val_array[:-1])
-            pred_direction = np.sign(val_pred[1:] - y_val_array[:-1])
-            directional_accuracy = (actual_direction == pred_direction).mean()
-            
-            # Feature importance
-            feature_importance = dict(zip(self.feature_columns, 
-                                         self.model.feature_importances_))
+            # Directional accuracy (sign bits of float32 moves; a flat move counts as up)
+            y_val_array = np.asarray(y_val)
+            actual_move = np.diff(y_val_array).astype(np.float32, copy=False)
+            pred_move = (val_pred[1:] - y_val_array[:-1]).astype(np.float32, copy=False)
+            directional_accuracy = float((np.signbit(actual_move) == np.signbit(pred_move)).mean())
+            
+            # Feature importance (gain, normalized to sum to 1)
+            gain = self.model.get_score(importance_type='gain')
+            total_gain = sum(gain.values()) or 1.0
+            feature_importance = {col: gain.get(col, 0.0) / total_gain
+                                  for col in self.feature_columns}
             top_features = sorted(feature_importance.items(), 
                                  key=lambda x: x[1], reverse=True)[:10]
             
@@ -319,51 +518,87 @@ class AdvancedXGBoostModel:
             logger.error(f"Error validating model: {str(e)}")
             return {}
     
-    def predict(self, X: np.ndarray, confidence_level: float = 0.95) -> pd.DataFrame:
+    def predict(self, X: np.ndarray, confidence_level: float = 0.95) -> Dict[str, List[float]]:
         """
         Generate predictions with confidence intervals
         Uses quantile regression for intervals
+        
+        Returns plain lists keyed by column, ready for JSON/DB records.
         """
         try:
             # Point prediction
-            predictions = self.model.predict(X)
+            predictions = self._predict_dmatrix(self._to_dmatrix(X)).astype(np.float32, copy=False)
             
             # Estimate confidence intervals using historical errors
             # (Simplified approach - could use quantile regression for better intervals)
             std_error = np.std(predictions) * 0.1  # Approximate
             z_score = 1.96  # 95% confidence
+            margin = np.float32(z_score * std_error)
             
-            results = pd.DataFrame({
-                'predicted_price': predictions,
-                'confidence_lower': predictions - z_score * std_error,
-                'confidence_upper': predictions + z_score * std_error
-            })
+            lower = np.subtract(predictions, margin, dtype=np.float32)
+            upper = np.add(predictions, margin, dtype=np.float32)
             
-            return results
+            return {
+                'predicted_price': predictions.tolist(),
+                'confidence_lower': lower.tolist(),
+                'confidence_upper': upper.tolist()
+            }
             
         except Exception as e:
             logger.error(f"Error generating predictions: {str(e)}")
-            return pd.DataFrame()
+            return {}
     
     def save_model(self, model_path: str, scaler_path: str, features_path: str):
         """Save model, scaler, and feature columns"""
         try:
-            joblib.dump(self.model, model_path)
-            joblib.dump(self.scaler, scaler_path)
-            joblib.dump(self.feature_columns, features_path)
+            # Write each artifact to a temp file and swap it in, the model last:
+            # readers never see a half-written file, and load_cached_model keys
+            # on all three mtimes, so a reload mid-save is not cached for long
+            temp_paths = {path: '{0}.tmp{1}'.format(*os.path.splitext(path))
+                          for path in (model_path, scaler_path, features_path)}
+            
+            np.savez(temp_paths[scaler_path], **self.scaler)
+            joblib.dump(list(self.feature_columns), temp_paths[features_path])
+            # Native XGBoost format for the booster (.ubj = universal binary JSON)
+            self.model.save_model(temp_paths[model_path])
+            
+            for path in (scaler_path, features_path, model_path):
+                os.replace(temp_paths[path], path)
             logger.info(f"Model saved to {model_path}")
         except Exception as e:
             logger.error(f"Error saving model: {str(e)}")
     
     def load_model(self, model_path: str, scaler_path: str, features_path: str):
-        """Load model, scaler, and feature columns"""
+        """Load model, scaler, and feature columns (raises if they are missing or inconsistent)"""
         try:
-            self.model = joblib.load(model_path)
-            self.scaler = joblib.load(scaler_path)
-            self.feature_columns = joblib.load(features_path)
+            if model_path.endswith('.pkl'):
+                # Legacy pickled artifacts (sklearn wrapper before the native API switch)
+                self.model = joblib.load(model_path)
+                if isinstance(self.model, xgb.XGBModel):
+                    self.model = self.model.get_booster()
+            else:
+                self.model = xgb.Booster()
+                self.model.load_model(model_path)
+            if scaler_path.endswith('.pkl'):
+                # Legacy pickled sklearn StandardScaler
+                scaler = joblib.load(scaler_path)
+                self.scaler = {'mean': scaler.mean_.astype(np.float32), 'scale': scaler.scale_.astype(np.float32)}
+            else:
+                with np.load(scaler_path) as scaler:
+                    self.scaler = {'mean': scaler['mean'], 'scale': scaler['scale']}
+            self.feature_columns = tuple(joblib.load(features_path))
+            
+            # Artifacts from different training runs would silently mis-scale inputs
+            n_features = len(self.feature_columns)
+            if not (len(self.scaler['mean']) == len(self.scaler['scale']) == n_features == self.model.num_features()):
+                raise ValueError(
+                    f"Model artifacts disagree on feature count: {n_features} feature columns, "
+                    f"{len(self.scaler['mean'])} scaler means, {self.model.num_features()} booster features"
+                )
             logger.info(f"Model loaded from {model_path}")
         except Exception as e:
             logger.error(f"Error loading model: {str(e)}")
+            raise
     
     def save_metadata(self, train_metrics: Dict, val_metrics: Dict,
                       training_start: datetime, training_end: datetime,
@@ -409,6 +644,26 @@ class AdvancedXGBoostModel:
             logger.error(traceback.format_exc())
 
 
+@lru_cache(maxsize=4)
+def _load_cached_model(model_path: str, scaler_path: str, features_path: str,
+                       mtimes_ns: Tuple[int, int, int]) -> AdvancedXGBoostModel:
+    """Load model artifacts once per (paths, artifact mtimes); failed loads raise and are not cached"""
+    model = AdvancedXGBoostModel()
+    model.load_model(model_path, scaler_path, features_path)
+    return model
+
+
+def load_cached_model(model_path: str, scaler_path: str, features_path: str) -> AdvancedXGBoostModel:
+    """
+    Get a loaded model, reading artifacts from disk only on first use
+    
+    The cache key includes the mtime of every artifact, so a retrained model
+    is picked up on the next call.
+    """
+    mtimes_ns = tuple(os.stat(path).st_mtime_ns for path in (model_path, scaler_path, features_path))
+    return _load_cached_model(model_path, scaler_path, features_path, mtimes_ns)
+
+
 def train_advanced_model(symbol: str = 'HDFCBANK.NS'):
     """Complete advanced model training pipeline"""
     logger.info("="*60)
@@ -447,8 +702,8 @@ def train_advanced_model(symbol: str = 'HDFCBANK.NS'):
     
     # Save model
     model.save_model(
-        "models/saved_models/advanced_xgboost_v1.0.pkl",
-        "models/saved_models/advanced_xgboost_v1.0_scaler.pkl",
+        "models/saved_models/advanced_xgboost_v1.0.ubj",
+        "models/saved_models/advanced_xgboost_v1.0_scaler.npz",
         "models/saved_models/advanced_xgboost_v1.0_features.pkl"
     )
     
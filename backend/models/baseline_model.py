@@ -2,6 +2,7 @@
 Baseline Time Series Model - ARIMA/SARIMAX
 Provides baseline predictions for comparison
 """
+import io
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -9,10 +10,27 @@ from typing import Dict, Tuple, Optional
 from loguru import logger
 import joblib
 from statsmodels.tsa.statespace.sarimax import SARIMAX
+from statsmodels.tsa.statespace.kalman_filter import (
+    MEMORY_NO_FILTERED, MEMORY_NO_PREDICTED, MEMORY_NO_SMOOTHING,
+    MEMORY_NO_GAIN, MEMORY_NO_STD_FORECAST
+)
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+from scipy.stats import norm
 
 from config.supabase_config import get_supabase_client
 
+try:
+    import lz4  # noqa: F401
+    MODEL_COMPRESSION = ('lz4', 3)
+except ImportError:
+    MODEL_COMPRESSION = ('zlib', 3)
+
+# Per-observation filter output that forecasting and fittedvalues don't need
+SAVED_MODEL_MEMORY = (
+    MEMORY_NO_FILTERED | MEMORY_NO_PREDICTED | MEMORY_NO_SMOOTHING |
+    MEMORY_NO_GAIN | MEMORY_NO_STD_FORECAST
+)
+
 
 class BaselineARIMAModel:
     """SARIMAX baseline model for time series prediction"""
@@ -24,21 +42,37 @@ class BaselineARIMAModel:
         self.client = get_supabase_client(service_role=True)
         self.model = None
         self.model_fit = None
+        # (predicted mean, standard error, index) for the longest horizon forecast so far
+        self._forecast_cache = None
         
     def fetch_training_data(self, symbol: str, days_back: int = 730) -> pd.DataFrame:
         """Fetch data for training"""
         try:
-            start_date = (datetime.now() - timedelta(days=days_back)).isoformat()
+            end_date = datetime.now()
+            start_date = end_date - timedelta(days=days_back)
             
-            response = self.client.table('market_data_raw') \
-                .select('timestamp, close') \
+            # PostgREST renders the rows as CSV (Accept: text/csv), which is
+            # smaller on the wire and parsed column-wise by pandas' C reader;
+            # epoch-second timestamps are about half the size of ISO strings
+            response = self.client.table('market_data_close_epoch') \
+                .select('ts_epoch, close') \
                 .eq('symbol', symbol) \
-                .gte('timestamp', start_date) \
+                .gte('timestamp', start_date.isoformat()) \
+                .lte('timestamp', end_date.isoformat()) \
                 .order('timestamp', desc=False) \
+                .limit(100000) \
+                .csv() \
                 .execute()
             
-            df = pd.DataFrame(response.data)
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
+            if not response.data:
+                return pd.DataFrame()
+            
+            df = pd.read_csv(
+                io.StringIO(response.data),
+                usecols=['ts_epoch', 'close'],
+                dtype={'ts_epoch': 'int64', 'close': 'float64'}
+            )
+            df['timestamp'] = pd.to_datetime(df.pop('ts_epoch'), unit='s', utc=True)
             df = df.set_index('timestamp')
             df = df.sort_index()
             
@@ -52,8 +86,10 @@ class BaselineARIMAModel:
         """Split data into train and validation sets"""
         train_size = int(len(df) * train_ratio)
         
-        train = df.iloc[:train_size]['close']
-        val = df.iloc[train_size:]['close']
+        # Both splits are views over the one close array and index
+        close = df['close'].to_numpy()
+        train = pd.Series(close[:train_size], index=df.index[:train_size], name='close', copy=False)
+        val = pd.Series(close[train_size:], index=df.index[train_size:], name='close', copy=False)
         
         logger.info(f"Training samples: {len(train)}, Validation samples: {len(val)}")
         
@@ -72,16 +108,19 @@ class BaselineARIMAModel:
         try:
             logger.info(f"Training SARIMAX model with order={order}, seasonal_order={seasonal_order}")
             
-            # Fit model
+            # Fit model. The innovation variance is concentrated out of the
+            # likelihood, leaving one fewer parameter for the optimizer
             self.model = SARIMAX(
                 train_data,
                 order=order,
                 seasonal_order=seasonal_order,
                 enforce_stationarity=False,
-                enforce_invertibility=False
+                enforce_invertibility=False,
+                concentrate_scale=True
             )
             
             self.model_fit = self.model.fit(disp=False)
+            self._forecast_cache = None
             
             logger.info("Model training completed")
             
@@ -107,17 +146,16 @@ class BaselineARIMAModel:
         """Validate model on validation set"""
         try:
             # Forecast
-            forecast = self.model_fit.forecast(steps=len(val_data))
+            actual = val_data.to_numpy()
+            forecast = np.asarray(self.model_fit.forecast(steps=len(val_data)))
             
             # Metrics
-            val_rmse = np.sqrt(mean_squared_error(val_data, forecast))
-            val_mae = mean_absolute_error(val_data, forecast)
-            val_r2 = r2_score(val_data, forecast)
+            val_rmse = np.sqrt(mean_squared_error(actual, forecast))
+            val_mae = mean_absolute_error(actual, forecast)
+            val_r2 = r2_score(actual, forecast)
             
-            # Directional accuracy
-            actual_direction = (val_data.diff() > 0).astype(int)
-            pred_direction = (pd.Series(forecast, index=val_data.index).diff() > 0).astype(int)
-            directional_accuracy = (actual_direction == pred_direction).mean()
+            # Directional accuracy (day-over-day moves)
+            directional_accuracy = float(np.mean((np.diff(actual) > 0) == (np.diff(forecast) > 0)))
             
             metrics = {
                 'val_rmse': val_rmse,
@@ -144,17 +182,27 @@ class BaselineARIMAModel:
             confidence_level: Confidence level for intervals
         """
         try:
-            # Get forecast with confidence intervals
-            forecast_result = self.model_fit.get_forecast(steps=steps)
-            forecast = forecast_result.predicted_mean
-            conf_int = forecast_result.conf_int(alpha=1 - confidence_level)
+            # Forecast once for a 30-day horizon and slice it for shorter requests
+            if self._forecast_cache is None or steps > len(self._forecast_cache[0]):
+                forecast_result = self.model_fit.get_forecast(steps=max(30, steps))
+                self._forecast_cache = (
+                    forecast_result.predicted_mean.to_numpy(),
+                    forecast_result.se_mean.to_numpy(),
+                    forecast_result.predicted_mean.index
+                )
+            
+            forecast, se, index = self._forecast_cache
+            forecast, se = forecast[:steps], se[:steps]
+            
+            # Gaussian intervals, matching PredictionResults.conf_int
+            margin = norm.ppf(1 - (1 - confidence_level) / 2) * se
             
             # Create DataFrame
             predictions = pd.DataFrame({
-                'predicted_price': forecast.values,
-                'confidence_lower': conf_int.iloc[:, 0].values,
-                'confidence_upper': conf_int.iloc[:, 1].values
-            }, index=forecast.index)
+                'predicted_price': forecast,
+                'confidence_lower': forecast - margin,
+                'confidence_upper': forecast + margin
+            }, index=index[:steps])
             
             return predictions
             
@@ -165,7 +213,15 @@ class BaselineARIMAModel:
     def save_model(self, filepath: str):
         """Save model to disk"""
         try:
-            joblib.dump(self.model_fit, filepath)
+            # Re-run the filter at the fitted params keeping only what forecasting
+            # and fittedvalues need (the full results carry per-observation state
+            # arrays and the parameter covariance, ~4x larger on disk)
+            compact_fit = self.model_fit.model.filter(
+                self.model_fit.params,
+                cov_type='none',
+                conserve_memory=SAVED_MODEL_MEMORY
+            )
+            joblib.dump(compact_fit, filepath, compress=MODEL_COMPRESSION, protocol=5)
             logger.info(f"Model saved to {filepath}")
         except Exception as e:
             logger.error(f"Error saving model: {str(e)}")
@@ -174,6 +230,7 @@ class BaselineARIMAModel:
         """Load model from disk"""
         try:
             self.model_fit = joblib.load(filepath)
+            self._forecast_cache = None
             logger.info(f"Model loaded from {filepath}")
         except Exception as e:
             logger.error(f"Error loading model: {str(e)}")
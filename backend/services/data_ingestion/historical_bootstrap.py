@@ -4,14 +4,44 @@ Ingests 5-10 years of historical data for HDFC Bank and related stocks
 """
 import yfinance as yf
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from loguru import logger
-import time
-import random
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from tenacity import (
+    RetryCallState, retry, retry_if_exception_type, retry_if_result,
+    stop_after_attempt, wait_exponential_jitter
+)
 
 from config.supabase_config import get_supabase_client
 
+# yf.download keeps per-call results in module-level state in older yfinance
+# releases, so concurrent symbol workers take turns on the download itself
+_YF_DOWNLOAD_LOCK = threading.Lock()
+
+
+def _is_empty(df: Optional[pd.DataFrame]) -> bool:
+    """yf.download reports most failures as an empty frame rather than raising"""
+    return df is None or df.empty
+
+
+def _log_retry(retry_state: RetryCallState):
+    """Log a failed download attempt before backing off"""
+    symbol = retry_state.args[1]
+    outcome = retry_state.outcome
+    reason = str(outcome.exception()) if outcome.failed else "no data"
+    logger.warning(f"Fetching {symbol} failed ({reason}), retrying in {retry_state.next_action.sleep:.1f}s...")
+
+
+def _log_retries_exhausted(retry_state: RetryCallState) -> None:
+    """Give up on a symbol after the last attempt (callers treat None as no data)"""
+    outcome = retry_state.outcome
+    if outcome.failed:
+        logger.error(f"Failed to fetch {retry_state.args[1]}: {str(outcome.exception())}")
+    return None
+
 
 class HistoricalDataBootstrap:
     """Handles one-time historical data ingestion"""
@@ -42,6 +72,29 @@ class HistoricalDataBootstrap:
             symbols.extend(symbol_list)
         return symbols
     
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential_jitter(initial=2, max=30),
+        retry=retry_if_exception_type(Exception) | retry_if_result(_is_empty),
+        before_sleep=_log_retry,
+        retry_error_callback=_log_retries_exhausted
+    )
+    def _download_once(self, symbol: str) -> Optional[pd.DataFrame]:
+        """Single yf.download attempt (retried with exponential backoff + jitter)"""
+        logger.info(f"Fetching historical data for {symbol} from {self.start_date.date()} to {self.end_date.date()}")
+        
+        # Use download() method which is more reliable than Ticker().history()
+        with _YF_DOWNLOAD_LOCK:
+            return yf.download(
+                symbol,
+                start=self.start_date,
+                end=self.end_date,
+                interval='1d',
+                auto_adjust=False,
+                actions=False,  # Don't fetch dividends/splits
+                progress=False  # Disable progress bar
+            )
+    
     def fetch_historical_data(self, symbol: str, max_retries: int = 3) -> Optional[pd.DataFrame]:
         """
         Fetch historical data for a symbol using yfinance with retry logic
@@ -53,45 +106,79 @@ class HistoricalDataBootstrap:
         Returns:
             DataFrame with OHLCV data
         """
-        for attempt in range(max_retries):
-            try:
-                logger.info(f"Fetching historical data for {symbol} from {self.start_date.date()} to {self.end_date.date()} (attempt {attempt + 1}/{max_retries})")
-                
-                # Use download() method which is more reliable than Ticker().history()
+        df = self._download_once.retry_with(stop=stop_after_attempt(max_retries))(self, symbol)
+        
+        if df is None or df.empty:
+            logger.warning(f"No data retrieved for {symbol} after {max_retries} attempts")
+            return None
+        
+        logger.info(f"Successfully fetched {len(df)} records for {symbol}")
+        
+        return self.format_market_data(df, symbol)
+    
+    def fetch_historical_data_bulk(self, symbols: List[str]) -> Dict[str, pd.DataFrame]:
+        """
+        Fetch historical data for several symbols with a single yfinance download
+        
+        Args:
+            symbols: Stock ticker symbols
+            
+        Returns:
+            Dictionary mapping symbol to OHLCV DataFrame (symbols that came back
+            empty are left out so callers can retry them individually)
+        """
+        try:
+            logger.info(f"Fetching historical data for {len(symbols)} symbols from {self.start_date.date()} to {self.end_date.date()}")
+            
+            with _YF_DOWNLOAD_LOCK:
                 df = yf.download(
-                    symbol,
+                    ' '.join(symbols),
                     start=self.start_date,
                     end=self.end_date,
                     interval='1d',
+                    group_by='ticker',
+                    threads=True,
                     auto_adjust=False,
-                    actions=False,  # Don't fetch dividends/splits
-                    progress=False  # Disable progress bar
+                    actions=False,
+                    progress=False
                 )
-                
-                if df is None or df.empty:
-                    if attempt < max_retries - 1:
-                        wait_time = (attempt + 1) * 3 + random.uniform(0, 2)
-                        logger.warning(f"No data retrieved for {symbol}, retrying in {wait_time:.1f}s...")
-                        time.sleep(wait_time)
-                        continue
-                    else:
-                        logger.warning(f"No data retrieved for {symbol} after {max_retries} attempts")
-                        return None
-                
-                # Successfully got data
-                logger.info(f"Successfully fetched {len(df)} records for {symbol}")
-                break
-                
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    wait_time = (attempt + 1) * 3 + random.uniform(0, 2)
-                    logger.warning(f"Error fetching {symbol}: {str(e)}, retrying in {wait_time:.1f}s...")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    logger.error(f"Failed to fetch {symbol} after {max_retries} attempts: {str(e)}")
-                    return None
+            
+        except Exception as e:
+            logger.error(f"Error fetching bulk historical data: {str(e)}")
+            return {}
+        
+        frames = {}
+        if df is None or df.empty:
+            return frames
+        
+        downloaded = set(df.columns.get_level_values(0))
+        for symbol in symbols:
+            if symbol not in downloaded:
+                continue
+            
+            # Frames are aligned on the union of trading days - drop the other symbols' days
+            symbol_df = df[symbol].dropna()
+            if symbol_df.empty:
+                continue
+            
+            formatted = self.format_market_data(symbol_df, symbol)
+            if formatted is not None:
+                frames[symbol] = formatted
+        
+        logger.info(f"Bulk download returned data for {len(frames)}/{len(symbols)} symbols")
+        return frames
+    
+    def format_market_data(self, df: pd.DataFrame, symbol: str) -> Optional[pd.DataFrame]:
+        """
+        Convert a yfinance OHLCV frame to the market_data_raw layout
         
+        Args:
+            df: yfinance DataFrame indexed by date
+            symbol: Stock ticker symbol
+            
+        Returns:
+            DataFrame with market_data_raw columns
+        """
         try:
             # Flatten multi-level columns if present (yf.download returns tuples)
             if isinstance(df.columns, pd.MultiIndex):
@@ -117,8 +204,10 @@ class HistoricalDataBootstrap:
             # Select only needed columns
             df = df[['symbol', 'timestamp', 'open', 'high', 'low', 'close', 'volume', 'adjusted_close']]
             
-            # Convert timestamp to ISO format string (remove timezone)
-            df['timestamp'] = pd.to_datetime(df['timestamp']).dt.tz_localize(None).dt.strftime('%Y-%m-%d %H:%M:%S')
+            # Convert timestamp to ISO format string (remove timezone) in one
+            # NumPy pass instead of a per-element strftime
+            timestamps = pd.to_datetime(df['timestamp']).dt.tz_localize(None).to_numpy(dtype='datetime64[s]')
+            df['timestamp'] = np.datetime_as_string(timestamps, unit='s').astype(object)
             
             # Convert numeric columns to native Python float (not numpy)
             for col in ['open', 'high', 'low', 'close', 'volume', 'adjusted_close']:
@@ -133,7 +222,7 @@ class HistoricalDataBootstrap:
             logger.error(traceback.format_exc())
             return None
     
-    def store_market_data(self, df: pd.DataFrame, batch_size: int = 1000) -> bool:
+    def store_market_data(self, df: pd.DataFrame, batch_size: int = 10000) -> bool:
         """
         Store market data in Supabase
         
@@ -148,22 +237,20 @@ class HistoricalDataBootstrap:
             symbol = df['symbol'].iloc[0]
             logger.info(f"Storing {len(df)} records for {symbol} in Supabase")
             
-            # Convert DataFrame to list of dicts with proper type conversion
-            records = []
-            for _, row in df.iterrows():
-                record = {
-                    'symbol': str(row['symbol']),
-                    'timestamp': str(row['timestamp']),
-                    'open': float(row['open']),
-                    'high': float(row['high']),
-                    'low': float(row['low']),
-                    'close': float(row['close']),
-                    'volume': int(row['volume']),  # bigint requires integer
-                    'adjusted_close': float(row['adjusted_close'])
-                }
-                records.append(record)
+            # Convert DataFrame to list of dicts with column-wise type conversion
+            records = df.assign(
+                symbol=df['symbol'].astype(str),
+                open=df['open'].astype(float),
+                high=df['high'].astype(float),
+                low=df['low'].astype(float),
+                close=df['close'].astype(float),
+                volume=df['volume'].astype('int64'),  # bigint requires integer
+                adjusted_close=df['adjusted_close'].astype(float)
+            )[['symbol', 'timestamp', 'open', 'high', 'low', 'close', 'volume', 'adjusted_close']] \
+                .to_dict('records')
             
-            # Insert in batches to avoid payload size limits
+            # Insert in batches to avoid payload size limits (10 years of daily
+            # bars for a symbol fit in one ~400 KB request)
             for i in range(0, len(records), batch_size):
                 batch = records[i:i + batch_size]
                 
@@ -174,7 +261,6 @@ class HistoricalDataBootstrap:
                 ).execute()
                 
                 logger.debug(f"Inserted batch {i // batch_size + 1} for {symbol}")
-                time.sleep(0.1)  # Rate limiting
             
             logger.info(f"Successfully stored data for {symbol}")
             return True
@@ -185,6 +271,14 @@ class HistoricalDataBootstrap:
             logger.error(traceback.format_exc())
             return False
     
+    def refresh_latest_market_data(self):
+        """Refresh the latest_market_data materialized view after new rows land"""
+        try:
+            self.client.rpc('refresh_latest_market_data').execute()
+            logger.info("Refreshed latest_market_data view")
+        except Exception as e:
+            logger.error(f"Error refreshing latest_market_data view: {str(e)}")
+    
     def log_job(self, job_type: str, status: str, message: str, details: Dict = None):
         """Log job execution to system_logs"""
         try:
@@ -198,16 +292,19 @@ class HistoricalDataBootstrap:
         except Exception as e:
             logger.error(f"Error logging to database: {str(e)}")
     
-    def bootstrap_symbol(self, symbol: str) -> bool:
+    def bootstrap_symbol(self, symbol: str, df: Optional[pd.DataFrame] = None) -> bool:
         """
         Bootstrap data for a single symbol
         
         Args:
             symbol: Stock ticker symbol
+            df: Already-downloaded data for the symbol (fetched here if None)
             
         Returns:
             True if successful
         """
+        logger.info(f"Processing {symbol}")
+        
         self.log_job(
             'historical_bootstrap',
             'started',
@@ -216,7 +313,8 @@ class HistoricalDataBootstrap:
         )
         
         # Fetch data
-        df = self.fetch_historical_data(symbol)
+        if df is None:
+            df = self.fetch_historical_data(symbol)
         if df is None or df.empty:
             self.log_job(
                 'historical_bootstrap',
@@ -254,21 +352,23 @@ class HistoricalDataBootstrap:
             Dictionary mapping symbol to success status
         """
         symbols = self.get_all_symbols()
-        results = {}
         
         logger.info(f"Starting historical bootstrap for {len(symbols)} symbols")
         logger.info(f"Date range: {self.start_date.date()} to {self.end_date.date()}")
         
-        for symbol in symbols:
-            logger.info(f"\n{'='*60}")
-            logger.info(f"Processing {symbol}")
-            logger.info(f"{'='*60}")
-            
-            success = self.bootstrap_symbol(symbol)
-            results[symbol] = success
-            
-            # Delay between symbols to respect rate limits
-            time.sleep(1)
+        # One download for every symbol; any that came back empty are retried
+        # individually inside bootstrap_symbol
+        frames = self.fetch_historical_data_bulk(symbols)
+        
+        # Storing is independent per symbol and I/O-bound - run them concurrently
+        with ThreadPoolExecutor(max_workers=len(symbols)) as executor:
+            results = dict(zip(symbols, executor.map(
+                self.bootstrap_symbol,
+                symbols,
+                [frames.get(symbol) for symbol in symbols]
+            )))
+        
+        self.refresh_latest_market_data()
         
         # Summary
         logger.info(f"\n{'='*60}")
@@ -301,7 +401,7 @@ class HistoricalDataBootstrap:
         for symbol in symbols:
             try:
                 response = self.client.table('market_data_raw') \
-                    .select('id', count='exact') \
+                    .select('id', count='exact', head=True) \
                     .eq('symbol', symbol) \
                     .execute()
                 
@@ -7,10 +7,14 @@ import pandas as pd
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from loguru import logger
-import time
-import schedule
+import asyncio
+import sys
+from apscheduler.schedulers.blocking import BlockingScheduler
+from apscheduler.triggers.combining import OrTrigger
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 
-from config.supabase_config import get_supabase_client
+from config.supabase_config import get_supabase_client, get_async_supabase_client, USE_SQL_RPC
 
 
 class RealtimeDataIngestion:
@@ -21,6 +25,7 @@ class RealtimeDataIngestion:
     
     def __init__(self):
         self.client = get_supabase_client(service_role=True)
+        self._loop = asyncio.new_event_loop()
     
     def get_latest_timestamp(self, symbol: str) -> Optional[datetime]:
         """Get the latest timestamp for a symbol in the database"""
@@ -42,13 +47,34 @@ class RealtimeDataIngestion:
             logger.error(f"Error getting latest timestamp for {symbol}: {str(e)}")
             return None
     
-    def fetch_incremental_data(self, symbol: str, since: Optional[datetime] = None) -> Optional[pd.DataFrame]:
+    def get_latest_timestamps(self, symbols: List[str]) -> Dict[str, datetime]:
+        """
+        Get the latest timestamp for each symbol in one round trip
+        
+        Symbols without any stored data are absent from the result.
+        """
+        if not USE_SQL_RPC:
+            latest = {symbol: self.get_latest_timestamp(symbol) for symbol in symbols}
+            return {symbol: ts for symbol, ts in latest.items() if ts is not None}
+        
+        try:
+            response = self.client.rpc('latest_timestamps', {'syms': symbols}).execute()
+            return {row['symbol']: pd.to_datetime(row['ts']) for row in response.data}
+            
+        except Exception as e:
+            logger.error(f"Error getting latest timestamps: {str(e)}")
+            return {}
+    
+    def fetch_incremental_data(self, symbol: str, since: Optional[datetime] = None) -> Optional[List[Dict]]:
         """
         Fetch incremental data since last update
         
         Args:
             symbol: Stock ticker symbol
             since: Fetch data since this timestamp (if None, fetches last 7 days)
+            
+        Returns:
+            market_data_raw records (usually only a handful of rows)
         """
         try:
             if since is None:
@@ -72,36 +98,44 @@ class RealtimeDataIngestion:
                 logger.debug(f"No new data for {symbol}")
                 return None
             
-            # Process DataFrame
-            df = df.reset_index()
-            df = df.rename(columns={
-                'Date': 'timestamp',
-                'Open': 'open',
-                'High': 'high',
-                'Low': 'low',
-                'Close': 'close',
-                'Volume': 'volume',
-                'Adj Close': 'adjusted_close'
-            })
-            
-            df['symbol'] = symbol
-            df = df[['symbol', 'timestamp', 'open', 'high', 'low', 'close', 'volume', 'adjusted_close']]
-            df['timestamp'] = pd.to_datetime(df['timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S%z')
-            
-            logger.info(f"Retrieved {len(df)} new records for {symbol}")
-            return df
+            # Build records straight from the column arrays - for a few rows the
+            # DataFrame rename/strftime/to_dict round trip costs more than the data
+            timestamps = df.index.to_pydatetime()
+            opens = df['Open'].to_numpy()
+            highs = df['High'].to_numpy()
+            lows = df['Low'].to_numpy()
+            closes = df['Close'].to_numpy()
+            volumes = df['Volume'].to_numpy()
+            adjusted_closes = df['Adj Close'].to_numpy()
+            
+            records = [
+                {
+                    'symbol': symbol,
+                    'timestamp': timestamps[i].strftime('%Y-%m-%d %H:%M:%S%z'),
+                    'open': float(opens[i]),
+                    'high': float(highs[i]),
+                    'low': float(lows[i]),
+                    'close': float(closes[i]),
+                    'volume': int(volumes[i]),
+                    'adjusted_close': float(adjusted_closes[i])
+                }
+                for i in range(len(timestamps))
+            ]
+            
+            logger.info(f"Retrieved {len(records)} new records for {symbol}")
+            return records
             
         except Exception as e:
             logger.error(f"Error fetching incremental data for {symbol}: {str(e)}")
             return None
     
-    def store_market_data(self, df: pd.DataFrame) -> bool:
-        """Store market data in Supabase"""
+    async def store_market_data(self, records: List[Dict]) -> bool:
+        """Store market data records in Supabase"""
         try:
-            symbol = df['symbol'].iloc[0]
-            records = df.to_dict('records')
+            symbol = records[0]['symbol']
+            client = await get_async_supabase_client(service_role=True)
             
-            response = self.client.table('market_data_raw').upsert(
+            response = await client.table('market_data_raw').upsert(
                 records,
                 on_conflict='symbol,timestamp'
             ).execute()
@@ -113,64 +147,93 @@ class RealtimeDataIngestion:
             logger.error(f"Error storing market data: {str(e)}")
             return False
     
-    def ingest_symbol(self, symbol: str) -> bool:
-        """Ingest latest data for a symbol"""
+    async def refresh_latest_market_data(self):
+        """Refresh the latest_market_data materialized view after new rows land"""
+        try:
+            client = await get_async_supabase_client(service_role=True)
+            await client.rpc('refresh_latest_market_data').execute()
+            logger.info("Refreshed latest_market_data view")
+        except Exception as e:
+            logger.error(f"Error refreshing latest_market_data view: {str(e)}")
+    
+    async def ingest_symbol(self, symbol: str, latest_ts: Optional[datetime]) -> bool:
+        """Ingest latest data for a symbol stored up to `latest_ts` (None if empty)"""
         try:
-            # Get latest timestamp
-            latest_ts = self.get_latest_timestamp(symbol)
-            
             if latest_ts:
                 logger.info(f"Latest data for {symbol}: {latest_ts.date()}")
             else:
                 logger.info(f"No existing data for {symbol}, fetching initial batch")
             
-            # Fetch incremental data
-            df = self.fetch_incremental_data(symbol, latest_ts)
+            # Fetch incremental data (yfinance is sync - run it off the event loop)
+            records = await asyncio.to_thread(self.fetch_incremental_data, symbol, latest_ts)
             
-            if df is None or df.empty:
+            if not records:
                 logger.debug(f"No new data to ingest for {symbol}")
                 return True
             
             # Store data
-            success = self.store_market_data(df)
+            success = await self.store_market_data(records)
             return success
             
         except Exception as e:
             logger.error(f"Error ingesting {symbol}: {str(e)}")
             return False
     
-    def ingest_all_symbols(self):
-        """Ingest latest data for all symbols"""
+    async def ingest_all_symbols_async(self):
+        """Ingest latest data for all symbols concurrently"""
         logger.info("Starting real-time data ingestion")
         
-        for symbol in self.SYMBOLS:
-            try:
-                self.ingest_symbol(symbol)
-                time.sleep(1)  # Rate limiting
-            except Exception as e:
-                logger.error(f"Error processing {symbol}: {str(e)}")
+        latest = self.get_latest_timestamps(self.SYMBOLS)
+        
+        # Symbols are independent and I/O-bound - overlap their fetches and upserts
+        await asyncio.gather(*[
+            self.ingest_symbol(symbol, latest.get(symbol))
+            for symbol in self.SYMBOLS
+        ])
+        
+        await self.refresh_latest_market_data()
         
         logger.info("Real-time ingestion complete")
     
+    def ingest_all_symbols(self):
+        """Ingest latest data for all symbols"""
+        # Every run shares one loop, so the cached async Supabase client and
+        # its connection pool stay bound to a live loop between runs
+        self._loop.run_until_complete(self.ingest_all_symbols_async())
+    
     def schedule_ingestion(self):
         """Schedule periodic ingestion"""
-        # Run every day at market close (3:30 PM IST / 10:00 AM UTC)
-        schedule.every().day.at("10:00").do(self.ingest_all_symbols)
+        # One job instance at a time: runs share self._loop
+        scheduler = BlockingScheduler(
+            job_defaults={'coalesce': True, 'max_instances': 1, 'misfire_grace_time': 600},
+            timezone='UTC'
+        )
         
-        # Also run every hour during market hours as backup
-        schedule.every().hour.do(self.ingest_all_symbols)
+        # Run every day at market close (3:30 PM IST / 10:00 AM UTC),
+        # and also every hour during market hours as backup
+        scheduler.add_job(self.ingest_all_symbols, OrTrigger([
+            CronTrigger(hour=10, minute=0),
+            IntervalTrigger(hours=1)
+        ]))
         
         logger.info("Scheduled real-time ingestion jobs")
         logger.info("- Daily at 10:00 UTC (3:30 PM IST)")
         logger.info("- Hourly backup")
         
-        while True:
-            schedule.run_pending()
-            time.sleep(60)
+        # Blocks until the next run is due - no polling loop
+        try:
+            scheduler.start()
+        except (KeyboardInterrupt, SystemExit):
+            logger.info("Ingestion scheduler stopped")
 
 
-def run_realtime_ingestion():
-    """Run real-time data ingestion service"""
+def run_realtime_ingestion(once: bool = False):
+    """
+    Run real-time data ingestion service
+    
+    Args:
+        once: Run a single ingestion and exit (for cron/systemd timers)
+    """
     logger.info("="*60)
     logger.info("REAL-TIME DATA INGESTION SERVICE")
     logger.info("="*60)
@@ -181,6 +244,9 @@ def run_realtime_ingestion():
     logger.info("Running initial ingestion...")
     ingestion.ingest_all_symbols()
     
+    if once:
+        return
+    
     # Then schedule periodic runs
     logger.info("\nStarting scheduled ingestion...")
     ingestion.schedule_ingestion()
@@ -194,4 +260,4 @@ if __name__ == "__main__":
         level="INFO"
     )
     
-    run_realtime_ingestion()
+    run_realtime_ingestion(once="--once" in sys.argv)
@@ -4,12 +4,19 @@ Generates technical indicators and sector-aware features
 """
 import pandas as pd
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from loguru import logger
-import ta  # Technical Analysis library
 
-from config.supabase_config import get_supabase_client
+from config.supabase_config import get_supabase_client, USE_SQL_RPC, SUPABASE_DB_URL
+from config.cache import cache_enabled, cache_path, covers_window, read_cache, refetch_start, write_cache
+
+try:
+    import psycopg
+    from psycopg import sql
+except ImportError:
+    psycopg = None
 
 
 class FeatureEngineer:
@@ -17,84 +24,268 @@ class FeatureEngineer:
     
     FEATURE_VERSION = "v1"
     
+    # Columns that are BIGINT in database schema
+    BIGINT_COLUMNS = {'obv', 'volume_sma_20'}
+    
+    # Non-numeric features_store columns (text in the COPY staging table)
+    TEXT_COLUMNS = {'symbol', 'timestamp', 'feature_version', 'regime_classification'}
+    CONFLICT_COLUMNS = ('symbol', 'timestamp', 'feature_version')
+    
+    # Regime label per classify_regime code (trend_up << 2 | trend_down << 1 | vol_spike);
+    # trend up wins over trend down, which wins over a volatility spike
+    REGIME_LABELS = np.array(
+        ['ranging', 'high_volatility', 'trending_down', 'trending_down'] + ['trending_up'] * 4,
+        dtype=object
+    )
+    
     def __init__(self):
         self.client = get_supabase_client(service_role=True)
     
-    def fetch_market_data(self, symbol: str, days_back: int = 365) -> pd.DataFrame:
-        """Fetch market data for feature engineering"""
+    def fetch_market_data(self, symbol: str, days_back: int = 365,
+                          start_date: Optional[str] = None) -> pd.DataFrame:
+        """Fetch market data for feature engineering (from `start_date` if given)"""
         try:
-            start_date = (datetime.now() - timedelta(days=days_back)).isoformat()
-            
-            response = self.client.table('market_data_raw') \
-                .select('*') \
-                .eq('symbol', symbol) \
-                .gte('timestamp', start_date) \
-                .order('timestamp', desc=False) \
-                .execute()
-            
-            if not response.data:
-                logger.warning(f"No data found for {symbol}")
-                return pd.DataFrame()
+            if start_date is None:
+                start_date = (datetime.now() - timedelta(days=days_back)).isoformat()
             
-            df = pd.DataFrame(response.data)
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df = df.sort_values('timestamp')
-            
-            return df
+            return self._query_market_data(symbol, start_date)
             
         except Exception as e:
             logger.error(f"Error fetching market data for {symbol}: {str(e)}")
             return pd.DataFrame()
     
+    def _query_market_data(self, symbol: str, start_date: str) -> pd.DataFrame:
+        """Query one symbol's market data from `start_date` (empty if no rows; raises on failure)"""
+        response = self.client.table('market_data_raw') \
+            .select('*') \
+            .eq('symbol', symbol) \
+            .gte('timestamp', start_date) \
+            .order('timestamp', desc=False) \
+            .execute()
+        
+        if not response.data:
+            logger.warning(f"No data found for {symbol}")
+            return pd.DataFrame()
+        
+        df = pd.DataFrame(response.data)
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        df = df.sort_values('timestamp')
+        
+        return df
+    
+    def fetch_many(self, symbols: List[str], days_back: int = 365,
+                   use_cache: bool = True) -> Dict[str, pd.DataFrame]:
+        """
+        Fetch market data for several symbols in one round trip
+        
+        Fetched history is kept in a local Parquet cache per symbol; when every
+        symbol's cache covers the window, only the trailing CACHE_REFETCH_DAYS
+        (from the earliest last cached timestamp) are downloaded (see config.cache).
+        
+        Returns:
+            Dictionary mapping symbol to its DataFrame (empty if no data); if
+            the fetch fails, every frame is empty and no cache is written
+        """
+        start_date = (datetime.now() - timedelta(days=days_back)).isoformat()
+        window_start = pd.Timestamp(start_date, tz='UTC')
+        
+        use_cache = use_cache and cache_enabled()
+        
+        cached = {}
+        if use_cache:
+            for symbol in symbols:
+                df = read_cache(self._market_cache_path(symbol))
+                # Skip caches that start after the requested window - rebuild them
+                if df is not None and covers_window(df, window_start):
+                    cached[symbol] = df
+        
+        if cached and len(cached) == len(symbols):
+            # Re-fetch a trailing overlap so rewritten recent bars replace cached ones
+            overlap_start = min(refetch_start(df) for df in cached.values())
+            cached = {symbol: df[df['timestamp'] < overlap_start] for symbol, df in cached.items()}
+            fetch_start = overlap_start.isoformat()
+        else:
+            cached = {}
+            fetch_start = start_date
+        
+        now = datetime.now().timestamp()
+        
+        try:
+            fetched = self._fetch_window(symbols, fetch_start)
+        except Exception as e:
+            # Never fall back to the cached frames here: they were cut at the
+            # overlap start, and a partial result would null out stored features
+            logger.error(f"Error fetching market data for {symbols}: {str(e)}")
+            return {symbol: pd.DataFrame() for symbol in symbols}
+        
+        frames = {}
+        for symbol in symbols:
+            df = fetched[symbol]
+            built_at = now
+            if symbol in cached:
+                built_at = cached[symbol].attrs['built_at']
+                if not df.empty:
+                    df = pd.concat([cached[symbol], df], ignore_index=True) \
+                        .drop_duplicates('timestamp', keep='last') \
+                        .sort_values('timestamp', ignore_index=True)
+                else:
+                    df = cached[symbol]
+            
+            if use_cache and not df.empty:
+                write_cache(df, self._market_cache_path(symbol), built_at)
+                df = df[df['timestamp'] >= window_start].reset_index(drop=True)
+            
+            frames[symbol] = df
+        
+        if cached:
+            logger.info(f"Loaded {len(cached)} symbols from the market data cache, fetched rows since {fetch_start}")
+        
+        return frames
+    
+    def _fetch_window(self, symbols: List[str], start_date: str) -> Dict[str, pd.DataFrame]:
+        """
+        Fetch market data for `symbols` from `start_date` onwards in one query
+        
+        Without the SQL RPC, the per-symbol queries run concurrently instead.
+        Raises if any symbol's query fails; empty frames only mean "no rows".
+        """
+        if not USE_SQL_RPC:
+            # Per-symbol queries are independent and I/O-bound - overlap them
+            with ThreadPoolExecutor(max_workers=len(symbols)) as executor:
+                return dict(zip(symbols, executor.map(
+                    lambda symbol: self._query_market_data(symbol, start_date),
+                    symbols
+                )))
+        
+        response = self.client.rpc('get_market_data_window', {
+            'p_symbols': symbols,
+            'p_start': start_date
+        }).execute()
+        rows = response.data or []
+        
+        frames = {symbol: pd.DataFrame() for symbol in symbols}
+        if not rows:
+            logger.warning(f"No data found for {symbols}")
+            return frames
+        
+        df = pd.DataFrame(rows)
+        df['timestamp'] = pd.to_datetime(df['timestamp'], format='ISO8601')
+        
+        for symbol, symbol_df in df.groupby('symbol', sort=False):
+            frames[symbol] = symbol_df.sort_values('timestamp').reset_index(drop=True)
+        
+        return frames
+    
+    @staticmethod
+    def _market_cache_path(symbol: str) -> str:
+        """Parquet cache file for a symbol's market data"""
+        return cache_path(f"market_{symbol}")
+    
     def calculate_technical_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
         """Calculate technical indicators"""
         try:
-            # Moving Averages
-            df['sma_5'] = ta.trend.sma_indicator(df['close'], window=5)
-            df['sma_20'] = ta.trend.sma_indicator(df['close'], window=20)
-            df['sma_50'] = ta.trend.sma_indicator(df['close'], window=50)
-            df['ema_12'] = ta.trend.ema_indicator(df['close'], window=12)
-            df['ema_26'] = ta.trend.ema_indicator(df['close'], window=26)
+            close = df['close']
             
-            # RSI
-            df['rsi_14'] = ta.momentum.rsi(df['close'], window=14)
+            # Vectorized with the same definitions as the `ta` library: no
+            # partial windows, unadjusted (recursive) EMAs, population std
+            ema_12 = close.ewm(span=12, min_periods=12, adjust=False).mean()
+            ema_26 = close.ewm(span=26, min_periods=26, adjust=False).mean()
             
             # MACD
-            macd = ta.trend.MACD(df['close'])
-            df['macd'] = macd.macd()
-            df['macd_signal'] = macd.macd_signal()
-            df['macd_histogram'] = macd.macd_diff()
-            
-            # Bollinger Bands
-            bollinger = ta.volatility.BollingerBands(df['close'])
-            df['bollinger_upper'] = bollinger.bollinger_hband()
-            df['bollinger_middle'] = bollinger.bollinger_mavg()
-            df['bollinger_lower'] = bollinger.bollinger_lband()
-            
-            # ATR (Average True Range)
-            df['atr_14'] = ta.volatility.average_true_range(df['high'], df['low'], df['close'], window=14)
-            
-            # OBV (On-Balance Volume)
-            df['obv'] = ta.volume.on_balance_volume(df['close'], df['volume'])
-            
-            return df
+            macd = ema_12 - ema_26
+            macd_signal = macd.ewm(span=9, min_periods=9, adjust=False).mean()
+            
+            # Bollinger Bands (20-day, 2 standard deviations)
+            bollinger_middle = close.rolling(window=20).mean()
+            bollinger_std = close.rolling(window=20).std(ddof=0)
+            
+            return df.assign(
+                # Moving Averages
+                sma_5=close.rolling(window=5).mean(),
+                sma_20=bollinger_middle,
+                sma_50=close.rolling(window=50).mean(),
+                ema_12=ema_12,
+                ema_26=ema_26,
+                # RSI
+                rsi_14=self._rsi(close, window=14),
+                macd=macd,
+                macd_signal=macd_signal,
+                macd_histogram=macd - macd_signal,
+                bollinger_upper=bollinger_middle + 2 * bollinger_std,
+                bollinger_middle=bollinger_middle,
+                bollinger_lower=bollinger_middle - 2 * bollinger_std,
+                # ATR (Average True Range)
+                atr_14=self._average_true_range(df['high'], df['low'], close, window=14),
+                # OBV (On-Balance Volume)
+                obv=self._on_balance_volume(close, df['volume'])
+            )
             
         except Exception as e:
             logger.error(f"Error calculating technical indicators: {str(e)}")
             return df
     
+    @staticmethod
+    def _rsi(close: pd.Series, window: int) -> pd.Series:
+        """Wilder's RSI (100 when there were no down moves in the window)"""
+        diff = np.diff(close.to_numpy(dtype=float), prepend=np.nan)
+        
+        # Smooth gains and losses side by side in a single EWM pass
+        moves = np.column_stack([np.clip(diff, 0, None), np.clip(-diff, 0, None)])
+        np.nan_to_num(moves, copy=False, nan=0.0)
+        emaup, emadn = pd.DataFrame(moves).ewm(alpha=1 / window, min_periods=window, adjust=False).mean().to_numpy().T
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = np.where(emadn == 0, 100.0, 100 - 100 / (1 + emaup / emadn))
+        return pd.Series(rsi, index=close.index)
+    
+    @staticmethod
+    def _average_true_range(high: pd.Series, low: pd.Series, close: pd.Series, window: int) -> pd.Series:
+        """Wilder's ATR, seeded with the mean true range of the first window (0 before that)"""
+        prev_close = close.shift(1).to_numpy()
+        true_range = np.fmax(
+            np.fmax(high.to_numpy() - low.to_numpy(), np.abs(high.to_numpy() - prev_close)),
+            np.abs(low.to_numpy() - prev_close)
+        )
+        
+        atr = np.zeros(len(true_range))
+        if len(true_range) >= window:
+            # Wilder smoothing is an unadjusted EWM with alpha = 1/window
+            smoothed = true_range[window - 1:].copy()
+            smoothed[0] = true_range[:window].mean()
+            atr[window - 1:] = pd.Series(smoothed).ewm(alpha=1 / window, adjust=False).mean().to_numpy()
+        
+        return pd.Series(atr, index=close.index)
+    
+    @staticmethod
+    def _on_balance_volume(close: pd.Series, volume: pd.Series) -> pd.Series:
+        """OBV: running volume total, subtracted on down days"""
+        close_values = close.to_numpy(dtype=float)
+        volume_values = volume.to_numpy()
+        
+        down = np.zeros(len(close_values), dtype=bool)
+        down[1:] = close_values[1:] < close_values[:-1]
+        
+        return pd.Series(np.where(down, -volume_values, volume_values).cumsum(), index=close.index)
+    
     def calculate_price_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """Calculate price-based features"""
         try:
-            # Returns
-            df['returns_1d'] = df['close'].pct_change(1)
-            df['returns_5d'] = df['close'].pct_change(5)
-            df['returns_20d'] = df['close'].pct_change(20)
+            close = df['close'].to_numpy(dtype=float)
             
-            # Volatility (rolling standard deviation of returns)
-            df['volatility_20d'] = df['returns_1d'].rolling(window=20).std()
+            # Returns: close[t] / close[t - N] - 1 straight off the close array
+            returns = {}
+            for periods in (1, 5, 20):
+                values = np.full_like(close, np.nan)
+                values[periods:] = close[periods:] / close[:-periods] - 1
+                returns[f'returns_{periods}d'] = values
             
-            return df
+            returns_1d = pd.Series(returns['returns_1d'], index=df.index)
+            
+            return df.assign(
+                **returns,
+                # Volatility (rolling standard deviation of returns)
+                volatility_20d=returns_1d.rolling(window=20).std()
+            )
             
         except Exception as e:
             logger.error(f"Error calculating price features: {str(e)}")
@@ -104,12 +295,13 @@ class FeatureEngineer:
         """Calculate volume-based features"""
         try:
             # Volume moving average
-            df['volume_sma_20'] = df['volume'].rolling(window=20).mean()
-            
-            # Volume ratio (current volume vs average)
-            df['volume_ratio'] = df['volume'] / df['volume_sma_20']
+            volume_sma_20 = df['volume'].rolling(window=20).mean()
             
-            return df
+            return df.assign(
+                volume_sma_20=volume_sma_20,
+                # Volume ratio (current volume vs average)
+                volume_ratio=df['volume'] / volume_sma_20
+            )
             
         except Exception as e:
             logger.error(f"Error calculating volume features: {str(e)}")
@@ -119,39 +311,34 @@ class FeatureEngineer:
                                   df_peers: List[pd.DataFrame]) -> pd.DataFrame:
         """Calculate sector correlation and relative strength features"""
         try:
-            # Merge with index data
-            merged = df_primary.merge(
-                df_index[['timestamp', 'close']],
-                on='timestamp',
-                how='left',
-                suffixes=('', '_index')
-            )
-            
-            # Correlation with sector index (rolling 20-day)
-            merged['correlation_nifty_bank'] = merged['returns_1d'].rolling(window=20).corr(
-                merged['close_index'].pct_change()
+            # Align the index and peer closes to our timestamps in one (N, 1 + peers)
+            # array and compute all their returns in one pass
+            timestamps = pd.Index(df_primary['timestamp'])
+            closes = np.column_stack([
+                other['close'].set_axis(other['timestamp']).reindex(timestamps).to_numpy(dtype=float)
+                for other in [df_index] + df_peers
+            ])
+            returns = np.full_like(closes, np.nan)
+            returns[1:] = closes[1:] / closes[:-1] - 1
+            
+            returns_1d = df_primary['returns_1d'].rolling(window=20)
+            merged = df_primary.assign(
+                # Correlation with sector index (rolling 20-day)
+                correlation_nifty_bank=returns_1d.corr(pd.Series(returns[:, 0], index=df_primary.index)),
+                # Relative strength vs sector
+                relative_strength_sector=df_primary['close'].to_numpy() / closes[:, 0]
             )
             
-            # Relative strength vs sector
-            merged['relative_strength_sector'] = merged['close'] / merged['close_index']
-            
             # Average correlation with banking peers
             if df_peers:
-                peer_returns = []
-                for peer_df in df_peers:
-                    peer_merged = merged.merge(
-                        peer_df[['timestamp', 'close']],
-                        on='timestamp',
-                        how='left',
-                        suffixes=('', '_peer')
-                    )
-                    peer_returns.append(peer_merged['close_peer'].pct_change())
+                # Mean across the peers that have a return that day (NaN if none)
+                peer_returns = returns[:, 1:]
+                peer_counts = np.count_nonzero(~np.isnan(peer_returns), axis=1)
+                avg_peer_returns = np.nansum(peer_returns, axis=1) / np.where(peer_counts > 0, peer_counts, np.nan)
                 
-                if peer_returns:
-                    avg_peer_returns = pd.concat(peer_returns, axis=1).mean(axis=1)
-                    merged['correlation_banking_peers'] = merged['returns_1d'].rolling(window=20).corr(
-                        avg_peer_returns
-                    )
+                merged['correlation_banking_peers'] = returns_1d.corr(
+                    pd.Series(avg_peer_returns, index=df_primary.index)
+                )
             
             return merged
             
@@ -162,21 +349,26 @@ class FeatureEngineer:
     def classify_regime(self, df: pd.DataFrame) -> pd.DataFrame:
         """Classify market regime (trending up/down, ranging, volatile)"""
         try:
-            # Trend classification based on moving averages
-            df['trend_up'] = (df['sma_5'] > df['sma_20']) & (df['sma_20'] > df['sma_50'])
-            df['trend_down'] = (df['sma_5'] < df['sma_20']) & (df['sma_20'] < df['sma_50'])
-            
-            # Trend strength (ADX-like measure)
-            df['trend_strength'] = abs(df['sma_5'] - df['sma_50']) / df['sma_50']
-            
-            # Regime classification
-            conditions = [
-                df['trend_up'] & (df['trend_strength'] > 0.02),
-                df['trend_down'] & (df['trend_strength'] > 0.02),
-                df['volatility_20d'] > df['volatility_20d'].rolling(window=50).mean() * 1.5,
-            ]
-            choices = ['trending_up', 'trending_down', 'high_volatility']
-            df['regime_classification'] = np.select(conditions, choices, default='ranging')
+            sma_5 = df['sma_5'].to_numpy()
+            sma_20 = df['sma_20'].to_numpy()
+            sma_50 = df['sma_50'].to_numpy()
+            volatility = df['volatility_20d']
+            
+            # Trend strength (ADX-like measure), computed in one buffer
+            trend_strength = np.subtract(sma_5, sma_50, dtype=float)
+            np.abs(trend_strength, out=trend_strength)
+            np.divide(trend_strength, sma_50, out=trend_strength)
+            df['trend_strength'] = trend_strength
+            
+            # Regime classification: pack the three conditions into a 3-bit
+            # code (trend up, trend down, volatility spike) and look the label up
+            strong = trend_strength > 0.02
+            trend_up = (sma_5 > sma_20) & (sma_20 > sma_50) & strong
+            trend_down = (sma_5 < sma_20) & (sma_20 < sma_50) & strong
+            vol_spike = volatility.to_numpy() > volatility.rolling(window=50).mean().to_numpy() * 1.5
+            
+            codes = (trend_up.view(np.uint8) << 2) | (trend_down.view(np.uint8) << 1) | vol_spike.view(np.uint8)
+            df['regime_classification'] = self.REGIME_LABELS[codes]
             
             return df
             
@@ -204,43 +396,92 @@ class FeatureEngineer:
         
         # Select columns that exist
         available_columns = [col for col in feature_columns if col in df.columns]
+        features = df[available_columns].copy()
+        
+        # Convert column-wise to JSON-ready values before building records
+        features['timestamp'] = features['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
         
-        # Convert to records, dropping NaN values
-        records = df[available_columns].replace({np.nan: None}).to_dict('records')
+        # Columns that are BIGINT in database schema
+        for col in self.BIGINT_COLUMNS.intersection(features.columns):
+            features[col] = np.trunc(features[col]).astype('Int64')
+        
+        # Object columns hold native Python scalars; missing values become None
+        features = features.astype(object)
+        records = features.where(features.notna(), None).to_dict('records')
         
         return records
     
+    def copy_features(self, records: List[Dict]) -> bool:
+        """
+        Store features over a direct Postgres connection
+        
+        Rows are streamed into a temp table with binary COPY and merged into
+        features_store with one INSERT ... ON CONFLICT, in a single transaction.
+        """
+        try:
+            columns = list(records[0])
+            types = [
+                'text' if col in self.TEXT_COLUMNS else 'int8' if col in self.BIGINT_COLUMNS else 'float8'
+                for col in columns
+            ]
+            column_list = sql.SQL(', ').join(map(sql.Identifier, columns))
+            
+            create_stage = sql.SQL("CREATE TEMP TABLE features_stage ({}) ON COMMIT DROP").format(
+                sql.SQL(', ').join(
+                    sql.SQL('{} {}').format(sql.Identifier(col), sql.SQL(col_type))
+                    for col, col_type in zip(columns, types)
+                )
+            )
+            # Timestamps are naive UTC strings (see prepare_features_for_storage)
+            merge = sql.SQL(
+                "INSERT INTO features_store ({columns}) SELECT {values} FROM features_stage "
+                "ON CONFLICT ({conflict}) DO UPDATE SET {updates}"
+            ).format(
+                columns=column_list,
+                values=sql.SQL(', ').join(
+                    sql.SQL("{}::timestamp AT TIME ZONE 'UTC'").format(sql.Identifier(col))
+                    if col == 'timestamp' else sql.Identifier(col)
+                    for col in columns
+                ),
+                conflict=sql.SQL(', ').join(map(sql.Identifier, self.CONFLICT_COLUMNS)),
+                updates=sql.SQL(', ').join(
+                    sql.SQL('{0} = EXCLUDED.{0}').format(sql.Identifier(col))
+                    for col in columns if col not in self.CONFLICT_COLUMNS
+                )
+            )
+            
+            with psycopg.connect(SUPABASE_DB_URL) as conn, conn.cursor() as cur:
+                cur.execute(create_stage)
+                
+                with cur.copy(sql.SQL("COPY features_stage ({}) FROM STDIN WITH (FORMAT BINARY)").format(column_list)) as copy:
+                    copy.set_types(types)
+                    for record in records:
+                        copy.write_row(tuple(record.values()))
+                
+                cur.execute(merge)
+            
+            logger.info(f"Copied {len(records)} feature records")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error copying features: {str(e)}")
+            return False
+    
     def store_features(self, records: List[Dict], batch_size: int = 1000) -> bool:
         """Store features in database"""
+        # Prefer binary COPY when a direct database connection is configured;
+        # the copy runs in one transaction, so on failure the REST upsert redoes it all
+        if SUPABASE_DB_URL and psycopg is not None and records:
+            if self.copy_features(records):
+                return True
+            logger.warning("Falling back to REST upsert for features")
+        
         try:
             logger.info(f"Storing {len(records)} feature records")
             
-            # Columns that are BIGINT in database schema
-            bigint_columns = {'obv', 'volume_sma_20'}
-            
-            # Convert pandas Timestamps to strings for JSON serialization
-            sanitized_records = []
-            for record in records:
-                sanitized = {}
-                for key, value in record.items():
-                    if pd.isna(value):
-                        sanitized[key] = None
-                    elif isinstance(value, pd.Timestamp):
-                        sanitized[key] = value.strftime('%Y-%m-%d %H:%M:%S')
-                    elif key in bigint_columns:
-                        # Convert to int for BIGINT columns
-                        sanitized[key] = int(value) if not pd.isna(value) else None
-                    elif isinstance(value, (np.integer, np.int64)):
-                        sanitized[key] = int(value)
-                    elif isinstance(value, (np.floating, np.float64)):
-                        sanitized[key] = float(value)
-                    else:
-                        sanitized[key] = value
-                sanitized_records.append(sanitized)
-            
             # Insert in batches
-            for i in range(0, len(sanitized_records), batch_size):
-                batch = sanitized_records[i:i + batch_size]
+            for i in range(0, len(records), batch_size):
+                batch = records[i:i + batch_size]
                 
                 self.client.table('features_store').upsert(
                     batch,
@@ -258,6 +499,49 @@ class FeatureEngineer:
             logger.error(traceback.format_exc())
             return False
     
+    def _needs_recompute(self, symbol: str) -> bool:
+        """
+        Check whether market data has moved past the stored features
+        
+        Only the primary symbol is compared: ^NSEBANK or peer rows that arrive
+        after the primary's latest bar do not trigger a recompute on their own.
+        Returns True (recompute) when no features exist yet or the check fails.
+        """
+        try:
+            if USE_SQL_RPC:
+                # Both "latest" lookups in one round trip
+                freshness = self.client.rpc('get_data_freshness', {
+                    'p_symbol': symbol,
+                    'p_feature_version': self.FEATURE_VERSION
+                }).execute().data
+                market_latest = freshness['market_data_latest']
+                features_latest = freshness['features_latest']
+            else:
+                market_response = self.client.table('market_data_raw') \
+                    .select('timestamp') \
+                    .eq('symbol', symbol) \
+                    .order('timestamp', desc=True) \
+                    .limit(1) \
+                    .execute()
+                features_response = self.client.table('features_store') \
+                    .select('timestamp') \
+                    .eq('symbol', symbol) \
+                    .eq('feature_version', self.FEATURE_VERSION) \
+                    .order('timestamp', desc=True) \
+                    .limit(1) \
+                    .execute()
+                market_latest = market_response.data[0] if market_response.data else None
+                features_latest = features_response.data[0] if features_response.data else None
+            
+            if not market_latest or not features_latest:
+                return True
+            
+            return pd.Timestamp(market_latest['timestamp']) > pd.Timestamp(features_latest['timestamp'])
+            
+        except Exception as e:
+            logger.warning(f"Could not check feature freshness for {symbol}: {str(e)}")
+            return True
+    
     def engineer_features(self, symbol: str = 'HDFCBANK.NS', days_back: int = 365) -> bool:
         """
         Complete feature engineering pipeline
@@ -267,24 +551,23 @@ class FeatureEngineer:
             days_back: Days of historical data to process
         """
         try:
+            if not self._needs_recompute(symbol):
+                logger.info(f"Skipping {symbol} - features up to date")
+                return True
+            
             logger.info(f"Engineering features for {symbol}")
             
-            # Fetch primary symbol data
-            df_primary = self.fetch_market_data(symbol, days_back)
+            # Fetch primary, sector index and peer data in one query
+            peers = ['ICICIBANK.NS', 'KOTAKBANK.NS', 'AXISBANK.NS']
+            frames = self.fetch_many([symbol, '^NSEBANK'] + peers, days_back)
+            
+            df_primary = frames[symbol]
             if df_primary.empty:
                 logger.error(f"No data available for {symbol}")
                 return False
             
-            # Fetch sector index data
-            df_index = self.fetch_market_data('^NSEBANK', days_back)
-            
-            # Fetch peer data
-            peers = ['ICICIBANK.NS', 'KOTAKBANK.NS', 'AXISBANK.NS']
-            df_peers = []
-            for peer in peers:
-                peer_df = self.fetch_market_data(peer, days_back)
-                if not peer_df.empty:
-                    df_peers.append(peer_df)
+            df_index = frames['^NSEBANK']
+            df_peers = [frames[peer] for peer in peers if not frames[peer].empty]
             
             # Calculate features
             logger.info("Calculating technical indicators...")
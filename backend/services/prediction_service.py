@@ -8,9 +8,10 @@ from datetime import datetime, timedelta
 from typing import List, Dict
 from loguru import logger
 import joblib
+import os
 
-from config.supabase_config import get_supabase_client
-from models.advanced_model import AdvancedXGBoostModel
+from config.supabase_config import get_supabase_client, USE_SQL_RPC
+from models.advanced_model import load_cached_model
 
 
 class PredictionService:
@@ -20,42 +21,51 @@ class PredictionService:
         self.client = get_supabase_client(service_role=True)
         self.model = None
         self.symbol = 'HDFCBANK.NS'
+        self._scaled_row = None  # reused float32 buffer for the scaled latest features
+        
+        # Warm the process-wide model cache at startup so the first scheduled
+        # run doesn't pay the load; a missing model (not trained yet) is
+        # retried on the next generate_predictions call
+        try:
+            self.load_model()
+        except Exception:
+            logger.warning("Model not loaded at startup; will retry when generating predictions")
         
     def load_model(self):
         """Load trained model"""
         try:
-            self.model = AdvancedXGBoostModel()
-            self.model.load_model(
-                "models/saved_models/advanced_xgboost_v1.0.pkl",
-                "models/saved_models/advanced_xgboost_v1.0_scaler.pkl",
+            model_path = "models/saved_models/advanced_xgboost_v1.0.ubj"
+            if not os.path.exists(model_path):
+                # Fall back to a model pickled before the native format switch
+                model_path = "models/saved_models/advanced_xgboost_v1.0.pkl"
+            
+            scaler_path = "models/saved_models/advanced_xgboost_v1.0_scaler.npz"
+            if not os.path.exists(scaler_path):
+                scaler_path = "models/saved_models/advanced_xgboost_v1.0_scaler.pkl"
+            
+            # Cached per process; only re-read from disk after retraining
+            self.model = load_cached_model(
+                model_path,
+                scaler_path,
                 "models/saved_models/advanced_xgboost_v1.0_features.pkl"
             )
+            
+            n_features = len(self.model.feature_columns)
+            if self._scaled_row is None or self._scaled_row.shape[1] != n_features:
+                self._scaled_row = np.empty((1, n_features), dtype=np.float32)
+            
             logger.info("Model loaded successfully")
         except Exception as e:
             logger.error(f"Error loading model: {str(e)}")
             raise
     
     def fetch_latest_features(self, days_back: int = 100) -> pd.DataFrame:
-        """Fetch latest features for prediction"""
-        try:
-            start_date = (datetime.now() - timedelta(days=days_back)).isoformat()
-            
-            response = self.client.table('features_store') \
-                .select('*') \
-                .eq('symbol', self.symbol) \
-                .eq('feature_version', 'v1') \
-                .gte('timestamp', start_date) \
-                .order('timestamp', desc=False) \
-                .execute()
-            
-            df = pd.DataFrame(response.data)
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            
-            return df
-            
-        except Exception as e:
-            logger.error(f"Error fetching features: {str(e)}")
-            return pd.DataFrame()
+        """
+        Fetch latest features for prediction
+        
+        Built column-wise as float32 by the model; empty if the window has no rows.
+        """
+        return self.model.fetch_recent_features(self.symbol, days_back=days_back)
     
     def generate_predictions(self, forecast_days: int = 5) -> List[Dict]:
         """
@@ -65,8 +75,7 @@ class PredictionService:
             forecast_days: Number of days to forecast
         """
         try:
-            if self.model is None:
-                self.load_model()
+            self.load_model()
             
             # Fetch latest features
             df = self.fetch_latest_features()
@@ -78,52 +87,50 @@ class PredictionService:
             df = self.model.prepare_features(df)
             
             # Get latest feature row
-            latest_features = df.iloc[-1:][self.model.feature_columns]
+            latest_features = df.iloc[-1:][list(self.model.feature_columns)]
             
             # Scale features
-            latest_scaled = self.model.scaler.transform(latest_features)
+            latest_scaled = self.model.scale_features(latest_features, out=self._scaled_row)
             
-            predictions = []
             current_date = datetime.now()
             
-            for day in range(1, forecast_days + 1):
-                target_date = current_date + timedelta(days=day)
-                
-                # Predict
-                pred_result = self.model.predict(latest_scaled)
-                predicted_price = pred_result['predicted_price'].iloc[0]
-                conf_lower = pred_result['confidence_lower'].iloc[0]
-                conf_upper = pred_result['confidence_upper'].iloc[0]
-                
-                # Get current price for direction
-                current_price_response = self.client.table('market_data_raw') \
-                    .select('close') \
-                    .eq('symbol', self.symbol) \
-                    .order('timestamp', desc=True) \
-                    .limit(1) \
-                    .execute()
-                
-                current_price = float(current_price_response.data[0]['close']) if current_price_response.data else None
-                
-                # Determine direction
-                if current_price:
-                    if predicted_price > current_price * 1.001:  # >0.1% change
-                        direction = 'UP'
-                        probability = 0.65
-                    elif predicted_price < current_price * 0.999:  # <-0.1% change
-                        direction = 'DOWN'
-                        probability = 0.65
-                    else:
-                        direction = 'NEUTRAL'
-                        probability = 0.5
+            # The model is fed the same latest row for every horizon, so one
+            # predict call covers all of them
+            pred_result = self.model.predict(latest_scaled)
+            predicted_price = pred_result['predicted_price'][0]
+            conf_lower = pred_result['confidence_lower'][0]
+            conf_upper = pred_result['confidence_upper'][0]
+            
+            # Get current price for direction
+            current_price_response = self.client.table('latest_market_data') \
+                .select('close') \
+                .eq('symbol', self.symbol) \
+                .execute()
+            
+            current_price = float(current_price_response.data[0]['close']) if current_price_response.data else None
+            
+            # Determine direction
+            if current_price:
+                if predicted_price > current_price * 1.001:  # >0.1% change
+                    direction = 'UP'
+                    probability = 0.65
+                elif predicted_price < current_price * 0.999:  # <-0.1% change
+                    direction = 'DOWN'
+                    probability = 0.65
                 else:
-                    direction = None
-                    probability = None
-                
-                # Create prediction record
-                prediction = {
+                    direction = 'NEUTRAL'
+                    probability = 0.5
+            else:
+                direction = None
+                probability = None
+            
+            target_dates = [current_date + timedelta(days=day) for day in range(1, forecast_days + 1)]
+            
+            # Create prediction records
+            predictions = [
+                {
                     'symbol': self.symbol,
-                    'prediction_timestamp': datetime.now().isoformat(),
+                    'prediction_timestamp': current_date.isoformat(),
                     'target_timestamp': target_date.isoformat(),
                     'predicted_price': float(predicted_price),
                     'confidence_lower': float(conf_lower),
@@ -135,10 +142,10 @@ class PredictionService:
                     'predicted_direction': direction,
                     'direction_probability': float(probability) if probability else None
                 }
-                
-                predictions.append(prediction)
-                
-                logger.info(f"Day {day}: Predicted ₹{predicted_price:.2f} for {target_date.date()}")
+                for target_date in target_dates
+            ]
+            
+            logger.info(f"Predicted ₹{predicted_price:.2f} for {target_dates[0].date()} to {target_dates[-1].date()}")
             
             return predictions
             
@@ -153,19 +160,12 @@ class PredictionService:
                 logger.warning("No predictions to store")
                 return False
             
-            # Check for existing predictions and delete them
-            for pred in predictions:
-                # Delete any existing predictions for same symbol, target_timestamp, and model
-                self.client.table('predictions') \
-                    .delete() \
-                    .eq('symbol', pred['symbol']) \
-                    .eq('target_timestamp', pred['target_timestamp']) \
-                    .eq('model_name', pred['model_name']) \
-                    .eq('model_version', pred['model_version']) \
-                    .execute()
-            
-            # Insert new predictions
-            response = self.client.table('predictions').insert(predictions).execute()
+            # Replace any existing predictions for the same symbol, target_timestamp
+            # and model in one round trip (see idx_predictions_upsert_key)
+            response = self.client.table('predictions').upsert(
+                predictions,
+                on_conflict='symbol,target_timestamp,model_name,model_version'
+            ).execute()
             
             logger.info(f"Stored {len(predictions)} predictions")
             return True
@@ -177,6 +177,12 @@ class PredictionService:
     def update_actual_prices(self):
         """Update predictions with actual prices once available"""
         try:
+            if USE_SQL_RPC:
+                # Join + update server-side in one statement
+                response = self.client.rpc('update_actual_prices').execute()
+                logger.info(f"Updated {response.data or 0} predictions with actual prices")
+                return
+            
             # Get predictions without actual prices where target date has passed
             response = self.client.table('predictions') \
                 .select('id, symbol, target_timestamp, predicted_price') \
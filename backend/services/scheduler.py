@@ -2,9 +2,12 @@
 Scheduler Service
 Manages periodic tasks for data ingestion, feature engineering, and predictions
 """
-import schedule
-import time
-from datetime import datetime
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.schedulers.blocking import BlockingScheduler
+from apscheduler.triggers.combining import OrTrigger
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from datetime import datetime, timedelta
 from loguru import logger
 
 from services.data_ingestion.realtime_ingestion import RealtimeDataIngestion
@@ -16,6 +19,8 @@ class SchedulerService:
     """Manages all scheduled tasks"""
     
     def __init__(self):
+        # get_supabase_client returns one process-wide client, so all three
+        # services share a single HTTP/2 keep-alive pool across job runs
         self.data_ingestion = RealtimeDataIngestion()
         self.feature_engineer = FeatureEngineer()
         self.prediction_service = PredictionService()
@@ -53,21 +58,28 @@ class SchedulerService:
         logger.info("SCHEDULER SERVICE STARTED")
         logger.info("="*60)
         
-        # Schedule jobs
+        # Each job can overlap the others but never itself; runs missed while
+        # the previous one is still going are coalesced into one
+        scheduler = BlockingScheduler(
+            executors={'default': ThreadPoolExecutor(3)},
+            job_defaults={'coalesce': True, 'max_instances': 1, 'misfire_grace_time': 3600},
+            timezone='UTC'
+        )
         
-        # Daily at 4 PM IST (10:30 AM UTC) - After market close
-        schedule.every().day.at("10:30").do(self.job_ingest_data)
-        
-        # Daily at 4:30 PM IST - After data ingestion
-        schedule.every().day.at("11:00").do(self.job_engineer_features)
-        
-        # Daily at 5 PM IST - After feature engineering
-        schedule.every().day.at("11:30").do(self.job_generate_predictions)
-        
-        # Also run every 6 hours as backup
-        schedule.every(6).hours.do(self.job_ingest_data)
-        schedule.every(6).hours.do(self.job_engineer_features)
-        schedule.every(6).hours.do(self.job_generate_predictions)
+        # Daily after market close (4 PM IST = 10:30 UTC), 30 minutes apart, plus
+        # a backup run every 6 hours staggered the same way so each stage still
+        # sees the previous stage's output
+        start = datetime.now().astimezone() + timedelta(hours=6)
+        jobs = [
+            (self.job_ingest_data, 10, 30),
+            (self.job_engineer_features, 11, 0),
+            (self.job_generate_predictions, 11, 30),
+        ]
+        for offset, (job, hour, minute) in enumerate(jobs):
+            scheduler.add_job(job, OrTrigger([
+                CronTrigger(hour=hour, minute=minute),
+                IntervalTrigger(hours=6, start_date=start + timedelta(minutes=30 * offset))
+            ]))
         
         logger.info("Scheduled jobs:")
         logger.info("- Data ingestion: Daily at 4:00 PM IST + every 6 hours")
@@ -80,12 +92,12 @@ class SchedulerService:
         self.job_engineer_features()
         self.job_generate_predictions()
         
-        # Start scheduler loop
+        # Blocks until the next job is due - no polling loop
         logger.info("\nScheduler running... (Ctrl+C to stop)")
-        while True:
-            schedule.run_pending()
-            time.sleep(60)  # Check every minute
-
+        try:
+            scheduler.start()
+        except (KeyboardInterrupt, SystemExit):
+            logger.info("Scheduler stopped")
 
 if __name__ == "__main__":
     logger.add(
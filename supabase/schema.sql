@@ -469,8 +469,29 @@ SELECT DISTINCT ON (symbol, target_timestamp)
 FROM predictions
 ORDER BY symbol, target_timestamp DESC, prediction_timestamp DESC;
 
--- Latest market data view
-CREATE OR REPLACE VIEW latest_market_data AS
+-- Latest market data per symbol (materialized so "latest price" reads are a
+-- single index lookup instead of a sort over market_data_raw).
+-- Only the historical bootstrap and real-time ingestion jobs call
+-- refresh_latest_market_data(); anything else that writes market_data_raw
+-- must call it too, or latest_market_data stays stale until the next
+-- ingestion run.
+
+-- Earlier schema versions created latest_market_data as a plain view; replace
+-- it (a materialized view from a previous run is kept)
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = current_schema()
+          AND c.relname = 'latest_market_data'
+          AND c.relkind = 'v'
+    ) THEN
+        DROP VIEW latest_market_data;
+    END IF;
+END $$;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS latest_market_data AS
 SELECT DISTINCT ON (symbol)
     symbol,
     timestamp,
@@ -483,6 +504,56 @@ SELECT DISTINCT ON (symbol)
 FROM market_data_raw
 ORDER BY symbol, timestamp DESC;
 
+-- Unique index required for REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS idx_latest_market_data_symbol
+    ON latest_market_data(symbol);
+
+CREATE OR REPLACE FUNCTION refresh_latest_market_data()
+RETURNS void AS $$
+BEGIN
+    REFRESH MATERIALIZED VIEW CONCURRENTLY latest_market_data;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Latest regime classification per symbol (batch regime lookups)
+CREATE OR REPLACE VIEW latest_regime AS
+SELECT DISTINCT ON (symbol)
+    symbol,
+    timestamp,
+    regime_classification,
+    trend_strength,
+    volatility_20d
+FROM features_store
+ORDER BY symbol, timestamp DESC;
+
+-- Technical indicators with the close price of the same bar
+CREATE OR REPLACE VIEW features_with_price AS
+SELECT
+    f.symbol,
+    f.timestamp,
+    m.close,
+    f.sma_5,
+    f.sma_20,
+    f.sma_50,
+    f.rsi_14,
+    f.macd,
+    f.macd_signal,
+    f.bollinger_upper,
+    f.bollinger_middle,
+    f.bollinger_lower
+FROM features_store f
+LEFT JOIN market_data_raw m USING (symbol, timestamp);
+
+-- Close series with epoch-second timestamps (compact model training reads;
+-- filter on timestamp so the (symbol, timestamp) index is still used)
+CREATE OR REPLACE VIEW market_data_close_epoch AS
+SELECT
+    symbol,
+    timestamp,
+    EXTRACT(EPOCH FROM timestamp)::BIGINT AS ts_epoch,
+    close::DOUBLE PRECISION AS close
+FROM market_data_raw;
+
 -- Performance summary view
 CREATE OR REPLACE VIEW performance_summary AS
 SELECT
@@ -501,7 +572,224 @@ GROUP BY model_name, model_version;
 -- Grant access to views
 GRANT SELECT ON latest_predictions TO anon, service_role;
 GRANT SELECT ON latest_market_data TO anon, service_role;
+GRANT SELECT ON latest_regime TO anon, service_role;
+GRANT SELECT ON features_with_price TO anon, service_role;
+GRANT SELECT ON market_data_close_epoch TO anon, service_role;
 GRANT SELECT ON performance_summary TO anon, service_role;
+GRANT EXECUTE ON FUNCTION refresh_latest_market_data() TO service_role;
+
+-- =============================================================================
+-- RPC FUNCTIONS FOR API AGGREGATES
+-- =============================================================================
+
+-- Regime counts since a start date (replaces client-side value_counts)
+CREATE OR REPLACE FUNCTION regime_distribution(p_symbol VARCHAR, p_start TIMESTAMPTZ)
+RETURNS JSONB AS $$
+    SELECT COALESCE(jsonb_object_agg(regime_classification, regime_count), '{}'::jsonb)
+    FROM (
+        SELECT regime_classification, COUNT(*) AS regime_count
+        FROM features_store
+        WHERE symbol = p_symbol
+          AND timestamp >= p_start
+          AND regime_classification IS NOT NULL
+        GROUP BY regime_classification
+    ) counts;
+$$ LANGUAGE sql STABLE;
+
+-- Error metrics for predictions with actual outcomes since a start date
+CREATE OR REPLACE FUNCTION prediction_accuracy_stats(p_symbol VARCHAR, p_model_name VARCHAR, p_start TIMESTAMPTZ)
+RETURNS TABLE (
+    rmse DOUBLE PRECISION,
+    mae DOUBLE PRECISION,
+    mape DOUBLE PRECISION,
+    directional_accuracy DOUBLE PRECISION,
+    sample_size BIGINT
+) AS $$
+    SELECT
+        SQRT(AVG(prediction_error * prediction_error))::DOUBLE PRECISION,
+        AVG(ABS(prediction_error))::DOUBLE PRECISION,
+        (AVG(ABS(prediction_error) / actual_price) * 100)::DOUBLE PRECISION,
+        AVG(direction_correct::INT)::DOUBLE PRECISION,
+        COUNT(*)
+    FROM predictions
+    WHERE symbol = p_symbol
+      AND model_name = p_model_name
+      AND target_timestamp >= p_start
+      AND actual_price IS NOT NULL;
+$$ LANGUAGE sql STABLE;
+
+-- Latest regime row + distribution since a start date in one call
+CREATE OR REPLACE FUNCTION get_regime_bundle(p_symbol VARCHAR, p_start TIMESTAMPTZ)
+RETURNS JSON AS $$
+    SELECT json_build_object(
+        'latest', (
+            SELECT row_to_json(latest_row)
+            FROM (
+                SELECT timestamp, regime_classification, trend_strength, volatility_20d
+                FROM features_store
+                WHERE symbol = p_symbol
+                ORDER BY timestamp DESC
+                LIMIT 1
+            ) latest_row
+        ),
+        'distribution', regime_distribution(p_symbol, p_start)
+    );
+$$ LANGUAGE sql STABLE;
+
+-- Indicator time series since a start date + current price in one call
+CREATE OR REPLACE FUNCTION get_technical_indicators_bundle(p_symbol VARCHAR, p_start TIMESTAMPTZ)
+RETURNS JSON AS $$
+    SELECT json_build_object(
+        'time_series', COALESCE((
+            SELECT json_agg(indicators ORDER BY indicators.timestamp)
+            FROM (
+                SELECT timestamp, close, sma_5, sma_20, sma_50, rsi_14, macd, macd_signal,
+                       bollinger_upper, bollinger_middle, bollinger_lower
+                FROM features_with_price
+                WHERE symbol = p_symbol
+                  AND timestamp >= p_start
+            ) indicators
+        ), '[]'::json)
+    );
+$$ LANGUAGE sql STABLE;
+
+-- Earlier versions took only p_symbol; drop that overload so one-argument
+-- calls are not ambiguous
+DROP FUNCTION IF EXISTS get_data_freshness(VARCHAR);
+
+-- Latest market data / features / prediction timestamps in one call
+-- (features limited to p_feature_version when given)
+CREATE OR REPLACE FUNCTION get_data_freshness(p_symbol VARCHAR, p_feature_version VARCHAR DEFAULT NULL)
+RETURNS JSON AS $$
+    SELECT json_build_object(
+        'market_data_latest', (
+            SELECT json_build_object('timestamp', timestamp)
+            FROM market_data_raw
+            WHERE symbol = p_symbol
+            ORDER BY timestamp DESC
+            LIMIT 1
+        ),
+        'features_latest', (
+            SELECT json_build_object('timestamp', timestamp)
+            FROM features_store
+            WHERE symbol = p_symbol
+              AND (p_feature_version IS NULL OR feature_version = p_feature_version)
+            ORDER BY timestamp DESC
+            LIMIT 1
+        ),
+        'predictions_latest', (
+            SELECT json_build_object('created_at', created_at)
+            FROM predictions
+            ORDER BY created_at DESC
+            LIMIT 1
+        )
+    );
+$$ LANGUAGE sql STABLE;
+
+-- Predictions for one target date grouped per model: {model_name: [predictions]}
+CREATE OR REPLACE FUNCTION compare_models_grouped(p_symbol VARCHAR, p_target_date DATE)
+RETURNS JSON AS $$
+    SELECT COALESCE(json_object_agg(model_name, model_predictions), '{}'::json)
+    FROM (
+        SELECT
+            model_name,
+            json_agg(json_build_object(
+                'id', id,
+                'model_name', model_name,
+                'model_version', model_version,
+                'target_timestamp', target_timestamp,
+                'predicted_price', predicted_price,
+                'confidence_lower', confidence_lower,
+                'confidence_upper', confidence_upper,
+                'predicted_direction', predicted_direction,
+                'direction_probability', direction_probability
+            ) ORDER BY prediction_timestamp) AS model_predictions
+        FROM predictions
+        WHERE symbol = p_symbol
+          AND target_timestamp >= p_target_date
+          AND target_timestamp < p_target_date + 1
+        GROUP BY model_name
+    ) grouped;
+$$ LANGUAGE sql STABLE;
+
+-- Full ordered close series for model targets (JSON scalar, so not capped by max-rows)
+CREATE OR REPLACE FUNCTION get_close_series(p_symbol VARCHAR)
+RETURNS JSON AS $$
+    SELECT COALESCE(
+        json_agg(json_build_object('timestamp', timestamp, 'close', close) ORDER BY timestamp),
+        '[]'::json
+    )
+    FROM market_data_raw
+    WHERE symbol = p_symbol;
+$$ LANGUAGE sql STABLE;
+
+-- Training features joined with the same-day (UTC) close, as one JSON value
+CREATE OR REPLACE FUNCTION get_features_with_close(
+    p_symbol VARCHAR,
+    p_feature_version VARCHAR,
+    p_start TIMESTAMPTZ DEFAULT NULL
+)
+RETURNS JSON AS $$
+    SELECT COALESCE(
+        json_agg(to_jsonb(f) || jsonb_build_object('close', m.close) ORDER BY f.timestamp),
+        '[]'::json
+    )
+    FROM features_store f
+    JOIN market_data_raw m
+      ON m.symbol = f.symbol
+     AND (m.timestamp AT TIME ZONE 'UTC')::date = (f.timestamp AT TIME ZONE 'UTC')::date
+    WHERE f.symbol = p_symbol
+      AND f.feature_version = p_feature_version
+      AND (p_start IS NULL OR f.timestamp >= p_start);
+$$ LANGUAGE sql STABLE;
+
+-- Latest stored timestamp per symbol (one round trip for the ingestion job)
+CREATE OR REPLACE FUNCTION latest_timestamps(syms TEXT[])
+RETURNS TABLE (symbol VARCHAR, ts TIMESTAMPTZ) AS $$
+    SELECT m.symbol, MAX(m.timestamp)
+    FROM market_data_raw m
+    WHERE m.symbol = ANY(syms)
+    GROUP BY m.symbol;
+$$ LANGUAGE sql STABLE;
+
+-- Market data rows for several symbols since a start date (JSON scalar, so not capped by max-rows)
+CREATE OR REPLACE FUNCTION get_market_data_window(p_symbols TEXT[], p_start TIMESTAMPTZ)
+RETURNS JSON AS $$
+    SELECT COALESCE(json_agg(m ORDER BY m.symbol, m.timestamp), '[]'::json)
+    FROM market_data_raw m
+    WHERE m.symbol = ANY(p_symbols)
+      AND m.timestamp >= p_start;
+$$ LANGUAGE sql STABLE;
+
+-- Fill actual_price for every matured prediction from the same-day (UTC) close
+-- in one statement; calculate_prediction_error_trigger still fires per row.
+-- Returns the number of predictions updated.
+CREATE OR REPLACE FUNCTION update_actual_prices()
+RETURNS INTEGER AS $$
+    WITH updated AS (
+        UPDATE predictions p
+        SET actual_price = m.close
+        FROM market_data_raw m
+        WHERE p.actual_price IS NULL
+          AND p.target_timestamp < NOW()
+          AND m.symbol = p.symbol
+          AND (m.timestamp AT TIME ZONE 'UTC')::date = (p.target_timestamp AT TIME ZONE 'UTC')::date
+        RETURNING p.id
+    )
+    SELECT COUNT(*)::INTEGER FROM updated;
+$$ LANGUAGE sql;
+
+GRANT EXECUTE ON FUNCTION regime_distribution(VARCHAR, TIMESTAMPTZ) TO anon, service_role;
+GRANT EXECUTE ON FUNCTION prediction_accuracy_stats(VARCHAR, VARCHAR, TIMESTAMPTZ) TO anon, service_role;
+GRANT EXECUTE ON FUNCTION get_regime_bundle(VARCHAR, TIMESTAMPTZ) TO anon, service_role;
+GRANT EXECUTE ON FUNCTION get_technical_indicators_bundle(VARCHAR, TIMESTAMPTZ) TO anon, service_role;
+GRANT EXECUTE ON FUNCTION get_data_freshness(VARCHAR, VARCHAR) TO anon, service_role;
+GRANT EXECUTE ON FUNCTION compare_models_grouped(VARCHAR, DATE) TO anon, service_role;
+GRANT EXECUTE ON FUNCTION get_close_series(VARCHAR) TO anon, service_role;
+GRANT EXECUTE ON FUNCTION get_features_with_close(VARCHAR, VARCHAR, TIMESTAMPTZ) TO anon, service_role;
+GRANT EXECUTE ON FUNCTION latest_timestamps(TEXT[]) TO anon, service_role;
+GRANT EXECUTE ON FUNCTION get_market_data_window(TEXT[], TIMESTAMPTZ) TO anon, service_role;
+GRANT EXECUTE ON FUNCTION update_actual_prices() TO service_role;
 
 -- =============================================================================
 -- COMMENTS FOR DOCUMENTATION
@@ -523,6 +811,10 @@ COMMENT ON TABLE system_logs IS 'System job execution logs';
 CREATE INDEX IF NOT EXISTS idx_predictions_model_target 
     ON predictions(model_name, model_version, target_timestamp DESC);
 
+-- Conflict target for prediction upserts (PredictionService.store_predictions)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_predictions_upsert_key 
+    ON predictions(symbol, target_timestamp, model_name, model_version);
+
 CREATE INDEX IF NOT EXISTS idx_features_symbol_version_timestamp 
     ON features_store(symbol, feature_version, timestamp DESC);
 